@@ -1,10 +1,17 @@
 """
 core 模块
+
+各子模块按需导入 (PEP 562)：下载器依赖 yt_dlp、总结器依赖 openai，
+仅使用 core.video_info 时 (如界面启动、视频预览) 不必加载这些重量级依赖
 """
-from .downloader import VideoDownloader
-from .audio_processor import AudioProcessor
-from .transcriber import Transcriber
-from .summarizer import Summarizer
+import importlib
+
+_EXPORTS = {
+    'VideoDownloader': '.downloader',
+    'AudioProcessor': '.audio_processor',
+    'Transcriber': '.transcriber',
+    'Summarizer': '.summarizer',
+}
 
 __all__ = [
     'VideoDownloader',
@@ -12,3 +19,12 @@ __all__ = [
     'Transcriber',
     'Summarizer'
 ]
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
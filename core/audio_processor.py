@@ -5,7 +5,12 @@
 import os
 import subprocess
 import json
-from typing import Callable, Optional
+import collections
+import concurrent.futures
+import threading
+from typing import Callable, Iterator, Optional
+
+from utils import cache
 
 
 class AudioProcessor:
@@ -16,17 +21,48 @@ class AudioProcessor:
     TARGET_CHANNELS = 1
     MAX_FILE_SIZE_MB = 25  # Whisper API限制
     
-    def __init__(self):
+    # 预先构造的 ffmpeg 输出参数，各处共用，避免重复拼接及参数不一致
+    _TARGET_FLAGS = ('-ar', str(TARGET_SAMPLE_RATE), '-ac', str(TARGET_CHANNELS))
+    _WAV_FLAGS = (*_TARGET_FLAGS, '-acodec', 'pcm_s16le')  # 16bit PCM
+    _MP3_FLAGS = (*_TARGET_FLAGS, '-acodec', 'libmp3lame')
+    
+    # 去除静音段并做动态音量归一化：缩短转写时长，同时提升识别准确率
+    # 注意：会删除所有超过 1 秒的停顿，转写时间戳将与原视频不再对应，因此默认关闭
+    _SILENCE_FILTER = (
+        'silenceremove=start_periods=1:start_duration=0.5:start_threshold=-50dB'
+        ':stop_periods=-1:stop_duration=1:stop_threshold=-45dB,'
+        'dynaudnorm=f=500:g=31'
+    )
+    
+    # 等待 ffmpeg 子进程期间检查取消请求的间隔（秒）
+    _CANCEL_POLL = 0.2
+    
+    # FFmpeg 能力探测结果 (进程内只探测一次)
+    _ffmpeg_caps: Optional[dict] = None
+    
+    def __init__(self, trim_silence: bool = False, cancel: Optional[threading.Event] = None):
+        """
+        Args:
+            trim_silence: 处理音频时是否去除静音段并归一化音量 (时间戳会与原视频错位)
+            cancel: 取消事件，设置后立即结束正在运行的 ffmpeg 子进程并抛出 InterruptedError
+        """
         self._check_ffmpeg()
+        self.trim_silence = trim_silence
+        self._cancel = cancel
+        # 时长缓存: (路径, mtime) -> 秒
+        self._duration_cache = {}
     
     def _check_ffmpeg(self):
-        """检查FFmpeg是否可用"""
+        """检查FFmpeg是否可用，并缓存其支持的编码器与多线程参数"""
+        if AudioProcessor._ffmpeg_caps is not None:
+            return
+        
         try:
-            subprocess.run(
-                ['ffmpeg', '-version'],
+            help_text = subprocess.run(
+                ['ffmpeg', '-h'],
                 capture_output=True,
                 check=True
-            )
+            ).stdout
         except (subprocess.CalledProcessError, FileNotFoundError):
             raise RuntimeError(
                 "FFmpeg未安装或不在PATH中。\n"
@@ -35,35 +71,154 @@ class AudioProcessor:
                 "  Ubuntu: sudo apt install ffmpeg\n"
                 "  Windows: choco install ffmpeg"
             )
+        
+        # 老版本 FFmpeg 可能不支持 -encoders，此时编码器列表留空
+        try:
+            encoders_text = subprocess.run(
+                ['ffmpeg', '-encoders'],
+                capture_output=True,
+                check=True
+            ).stdout
+        except subprocess.CalledProcessError:
+            encoders_text = b''
+        
+        encoders = set()
+        for line in encoders_text.decode(errors='ignore').splitlines():
+            parts = line.split()
+            if len(parts) >= 2 and parts[0][:1] in ('A', 'V', 'S'):
+                encoders.add(parts[1])
+        
+        # -threads 0: 解码器自动选择线程数
+        # -filter_threads 0: 滤镜图 (重采样/混音) 自动多线程，FFmpeg 4.0 之后才有
+        thread_args = ['-threads', '0']
+        if b'-filter_threads' in help_text:
+            thread_args += ['-filter_threads', '0']
+        
+        AudioProcessor._ffmpeg_caps = {
+            'encoders': encoders,
+            'thread_args': thread_args,
+        }
+    
+    @property
+    def _thread_args(self) -> list:
+        """ffmpeg 多线程参数"""
+        return self._ffmpeg_caps['thread_args']
+    
+    def _check_cancel(self):
+        if self._cancel is not None and self._cancel.is_set():
+            raise InterruptedError("任务已取消")
+    
+    def _run_ffmpeg(self, cmd: list):
+        """
+        运行 ffmpeg 命令
+        
+        stdout 直接丢弃；stderr 使用 1MB 管道缓冲，仅在失败时用于报告错误；
+        等待期间定期检查取消事件，取消或出错时结束子进程，不留下孤儿 ffmpeg
+        """
+        self._check_cancel()
+        proc = subprocess.Popen(
+            cmd,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            bufsize=1 << 20
+        )
+        try:
+            while True:
+                try:
+                    _, stderr = proc.communicate(timeout=self._CANCEL_POLL if self._cancel else None)
+                    break
+                except subprocess.TimeoutExpired:
+                    self._check_cancel()
+        except BaseException:
+            proc.kill()
+            proc.wait()
+            raise
+        if proc.returncode != 0:
+            raise subprocess.CalledProcessError(proc.returncode, cmd, stderr=stderr)
     
     def _get_audio_duration(self, audio_path: str) -> float:
         """获取音频时长（秒）"""
+        try:
+            key = (audio_path, os.stat(audio_path).st_mtime_ns)
+        except OSError:
+            return 0
+        
+        if key not in self._duration_cache:
+            duration = self._probe_duration_av(audio_path)
+            if duration is None:
+                duration = self._probe_duration_ffprobe(audio_path)
+            self._duration_cache[key] = duration
+        return self._duration_cache[key]
+    
+    @staticmethod
+    def _probe_duration_av(audio_path: str) -> Optional[float]:
+        """通过 PyAV 在进程内读取容器时长，未安装或读取失败时返回 None"""
+        try:
+            import av
+        except ImportError:
+            return None
+        
+        try:
+            with av.open(audio_path) as container:
+                if container.duration is None:
+                    return None
+                return float(container.duration) / av.time_base
+        except Exception:
+            return None
+    
+    @staticmethod
+    def _probe_duration_ffprobe(audio_path: str) -> float:
+        """通过 ffprobe 子进程读取时长（PyAV 不可用时的回退方案）"""
         try:
             result = subprocess.run([
                 'ffprobe', '-v', 'quiet',
                 '-print_format', 'json',
                 '-show_format',
                 audio_path
-            ], capture_output=True, text=True, check=True)
+            ], capture_output=True, check=True)
             
+            # json.loads 可直接解析 bytes，无需先整体解码为 str
             info = json.loads(result.stdout)
             return float(info.get('format', {}).get('duration', 0))
         except Exception:
             return 0
     
+    def needs_recompression(self, audio_path: str, target_kbps: int = 64) -> bool:
+        """
+        判断音频是否需要为 API 上传重新压缩
+        
+        通过 ffprobe 读取首个音频流的码率，已不高于 target_kbps 时重新编码收益很小；
+        无法读取码率 (如 WAV 等未记录码率的格式) 时视为需要压缩
+        """
+        try:
+            result = subprocess.run([
+                'ffprobe', '-v', '0',
+                '-select_streams', 'a:0',
+                '-show_entries', 'stream=bit_rate,codec_name',
+                '-of', 'json',
+                audio_path
+            ], capture_output=True, check=True)
+            streams = json.loads(result.stdout).get('streams') or [{}]
+            bit_rate = int(streams[0].get('bit_rate') or 0)
+        except (subprocess.CalledProcessError, OSError, ValueError):
+            return True
+        return bit_rate <= 0 or bit_rate > target_kbps * 1000
+    
     def process_audio(
         self,
         input_path: str,
         output_path: Optional[str] = None,
-        progress_callback: Optional[Callable[[float, str], None]] = None
+        progress_callback: Optional[Callable[[float, str], None]] = None,
+        duration: Optional[float] = None
     ) -> str:
         """
         处理音频文件，转换为Whisper最佳格式
         
         Args:
             input_path: 输入音频路径
-            output_path: 输出路径（可选，默认同目录下.wav）
+            output_path: 输出路径（可选，默认同目录下.wav；需要压缩时改为.mp3）
             progress_callback: 进度回调
+            duration: 已知的音频时长（秒），传入可省去一次 ffprobe 调用
         
         Returns:
             处理后的音频文件路径
@@ -79,12 +234,30 @@ class AudioProcessor:
             base = os.path.splitext(input_path)[0]
             output_path = f"{base}_processed.wav"
         
+        # 相同输入内容的处理结果直接从缓存复用
+        cache_key = None
+        if cache.ENABLED:
+            cache_key = cache.make_key(
+                cache.file_digest(input_path),
+                self.TARGET_SAMPLE_RATE,
+                self.TARGET_CHANNELS,
+                self._SILENCE_FILTER if self.trim_silence else None
+            )
+            cached = cache.get_file('audio', cache_key)
+            if cached:
+                output_path = os.path.splitext(output_path)[0] + os.path.splitext(cached)[1]
+                cache.link_or_copy(cached, output_path)
+                if progress_callback:
+                    progress_callback(75, "使用已缓存的音频")
+                return output_path
+        
         if progress_callback:
             progress_callback(60, "转换音频格式...")
         
         try:
-            # 获取原始时长用于计算比特率
-            duration = self._get_audio_duration(input_path)
+            # 获取原始时长用于计算比特率（下载器已知时长时直接复用）
+            if not duration:
+                duration = self._get_audio_duration(input_path)
             
             # 计算目标比特率（如果需要压缩）
             # 估算：16kHz mono 16bit = 约 256 kbps 未压缩
@@ -100,67 +273,95 @@ class AudioProcessor:
             if progress_callback:
                 progress_callback(65, "优化音频大小...")
             
-            # 使用FFmpeg转换
-            cmd = [
-                'ffmpeg', '-y',  # 覆盖输出文件
-                '-i', input_path,
-                '-ar', str(self.TARGET_SAMPLE_RATE),  # 采样率
-                '-ac', str(self.TARGET_CHANNELS),  # 声道数
-                '-acodec', 'pcm_s16le',  # 16bit PCM
-            ]
+            # 默认情况 (不去静音、无需压缩) 优先在进程内完成转换，省去 ffmpeg 进程；
+            # 需要滤镜或 MP3 压缩、或 PyAV 不可用时使用 ffmpeg
+            converted = False
+            if not target_bitrate and not self.trim_silence:
+                converted = self._convert_wav_in_process(input_path, output_path)
             
-            # 如果需要压缩，先转成mp3再转wav
-            if target_bitrate and target_bitrate < 128:
-                # 两步转换：先压缩成mp3
-                temp_mp3 = output_path.replace('.wav', '_temp.mp3')
-                compress_cmd = [
-                    'ffmpeg', '-y',
-                    '-i', input_path,
-                    '-ar', str(self.TARGET_SAMPLE_RATE),
-                    '-ac', str(self.TARGET_CHANNELS),
-                    '-b:a', f'{target_bitrate}k',
-                    temp_mp3
-                ]
-                
-                if progress_callback:
-                    progress_callback(68, f"压缩音频 (目标: {target_bitrate}kbps)...")
-                
-                subprocess.run(
-                    compress_cmd,
-                    capture_output=True,
-                    check=True
-                )
-                
-                # 再转成wav
+            if not converted:
+                # 单次 FFmpeg 调用完成 重采样 + 混音 + 编码
+                # -vn: 丢弃视频流（输入可能是完整视频文件）
                 cmd = [
-                    'ffmpeg', '-y',
-                    '-i', temp_mp3,
-                    '-ar', str(self.TARGET_SAMPLE_RATE),
-                    '-ac', str(self.TARGET_CHANNELS),
-                    '-acodec', 'pcm_s16le',
-                    output_path
+                    'ffmpeg', '-y',  # 覆盖输出文件
+                    '-loglevel', 'error', '-nostats',  # 只在出错时输出
+                    *self._thread_args,
+                    '-i', input_path,
+                    '-vn',
                 ]
+                if self.trim_silence:
+                    cmd += ['-af', self._SILENCE_FILTER]
+            
+                if target_bitrate:
+                    # 长音频直接输出限定码率的 MP3（Whisper 可直接读取 MP3），
+                    # 不再经过 mp3 -> wav 的临时文件往返
+                    output_path = os.path.splitext(output_path)[0] + '.mp3'
+                    cmd += [*self._MP3_FLAGS, '-b:a', f'{target_bitrate}k']
                 
-                subprocess.run(cmd, capture_output=True, check=True)
-                
-                # 清理临时文件
-                if os.path.exists(temp_mp3):
-                    os.remove(temp_mp3)
-            else:
-                # 直接转换
+                    if progress_callback:
+                        progress_callback(68, f"压缩音频 (目标: {target_bitrate}kbps)...")
+                else:
+                    cmd += self._WAV_FLAGS
+            
                 cmd.append(output_path)
-                subprocess.run(cmd, capture_output=True, check=True)
+                self._run_ffmpeg(cmd)
+            
+            if cache_key:
+                cache.put_file('audio', cache_key, output_path)
             
             if progress_callback:
                 progress_callback(75, "音频处理完成")
             
             return output_path
             
+        except InterruptedError:
+            raise
         except subprocess.CalledProcessError as e:
             error_msg = e.stderr.decode() if e.stderr else str(e)
             raise Exception(f"音频处理失败: {error_msg}")
         except Exception as e:
             raise Exception(f"音频处理失败: {str(e)}")
+    
+    def _convert_wav_in_process(self, input_path: str, output_path: str) -> bool:
+        """
+        使用 PyAV 在进程内完成 解码 + 混音 + 重采样 + 16bit PCM 封装
+        
+        重采样由 libswresample 完成，与 ffmpeg 命令行结果一致。
+        PyAV 未安装或转换失败时返回 False，由调用方回退到 ffmpeg 子进程。
+        """
+        try:
+            import av
+        except ImportError:
+            return False
+        
+        try:
+            with av.open(input_path) as src, av.open(output_path, 'w', format='wav') as dst:
+                in_stream = src.streams.audio[0]
+                out_stream = dst.add_stream('pcm_s16le', rate=self.TARGET_SAMPLE_RATE)
+                out_stream.codec_context.layout = 'mono'
+                out_stream.codec_context.format = 's16'
+                resampler = av.AudioResampler(
+                    format='s16',
+                    layout='mono',
+                    rate=self.TARGET_SAMPLE_RATE
+                )
+                
+                for frame in src.decode(in_stream):
+                    for out_frame in resampler.resample(frame):
+                        dst.mux(out_stream.encode(out_frame))
+                # 冲刷重采样器与编码器中的剩余数据
+                for out_frame in resampler.resample(None):
+                    dst.mux(out_stream.encode(out_frame))
+                dst.mux(out_stream.encode(None))
+            return True
+        except Exception as e:
+            print(f"⚠️ 进程内音频转换失败，回退到 FFmpeg: {e}")
+            try:
+                os.remove(output_path)
+            except OSError:
+                pass
+            return False
+    
     def compress_for_api(
         self,
         input_path: str,
@@ -169,14 +370,17 @@ class AudioProcessor:
         progress_callback: Optional[Callable[[float, str], None]] = None
     ) -> str:
         """
-        专门为API转写压缩音频（目标MP3格式，严格控制大小）
+        专门为API转写压缩音频（优先 Opus/OGG，不支持时回退 MP3，严格控制大小）
         """
         if not os.path.exists(input_path):
             raise FileNotFoundError(f"音频文件不存在: {input_path}")
+        
+        # 低码率下 Opus (VoIP 模式) 的语音质量远好于 MP3，Whisper 识别更准确
+        use_opus = 'libopus' in self._ffmpeg_caps['encoders']
             
         if not output_path:
             base = os.path.splitext(input_path)[0]
-            output_path = f"{base}_compressed.mp3"
+            output_path = f"{base}_compressed{'.ogg' if use_opus else '.mp3'}"
             
         duration = self._get_audio_duration(input_path)
         if duration <= 0:
@@ -190,27 +394,36 @@ class AudioProcessor:
             target_bitrate_kbps = int(target_size_bits / duration / 1000)
             
             # 限制范围：
-            # 最低 12kbps (对于纯语音，Opus/MP3 VBR勉强可辨识，Whisper鲁棒性很强)
+            # 最低 12kbps (对于纯语音，Opus 仍清晰可辨，MP3 VBR勉强可辨识，Whisper鲁棒性很强)
             # 最高 64kbps (不需要太高)
             bitrate_kbps = min(max(target_bitrate_kbps, 12), 64)
         
         if progress_callback:
             progress_callback(62, f"正在压缩音频以适应 API 限制 (目标码率: {bitrate_kbps}k)...")
 
-        # 使用 ffmpeg 压缩为 MP3
+        # 使用 ffmpeg 压缩
         # -ac 1: 单声道 (节省一半码率)
         # -ar 16000: 16kHz (语音足够)
         cmd = [
             'ffmpeg', '-y',
+            '-loglevel', 'error', '-nostats',
+            *self._thread_args,
             '-i', input_path,
-            '-ar', '16000',
-            '-ac', '1', 
+            '-vn',
+            *self._TARGET_FLAGS,
             '-b:a', f'{bitrate_kbps}k',
-            output_path
         ]
+        if use_opus:
+            cmd += [
+                '-c:a', 'libopus',
+                '-application', 'voip',
+                '-vbr', 'on',
+                '-compression_level', '10',
+            ]
+        cmd.append(output_path)
         
         try:
-             subprocess.run(cmd, capture_output=True, check=True)
+             self._run_ffmpeg(cmd)
              
              # 验证压缩后的大小，如果还是太大，可能ffmpeg没严格遵守（VBR情况）
              # 这里暂不重试，因为如果12kbps都超标，那只能切片了
@@ -223,10 +436,32 @@ class AudioProcessor:
         self,
         input_path: str,
         segment_seconds: int = 300,
-        output_dir: Optional[str] = None
+        output_dir: Optional[str] = None,
+        cut_points: Optional[list] = None
     ) -> list[str]:
         """
         将音频分割成多个片段 (用于 API 切片上传)
+        
+        Args:
+            segment_seconds: 固定切片时长（秒）
+            cut_points: 指定的切点时间列表（秒，升序），提供时代替固定时长切片
+        """
+        return list(self.iter_split_audio(input_path, segment_seconds, output_dir, cut_points))
+    
+    def iter_split_audio(
+        self,
+        input_path: str,
+        segment_seconds: int = 300,
+        output_dir: Optional[str] = None,
+        cut_points: Optional[list] = None
+    ) -> Iterator[str]:
+        """
+        分割音频，按顺序逐个产出已完成的片段路径，调用方可以边切边上传
+        
+        分两步流水进行:
+          1. 流复制 (-c copy) 按时间切段，不重新编码，速度接近磁盘读写；
+             ffmpeg 每写完一段就通过 -segment_list pipe:1 报告文件名
+          2. 每报告一段立即提交给线程池，由 ffmpeg 子进程转码为 16k mono MP3
         """
         if not os.path.exists(input_path):
             raise FileNotFoundError(f"音频文件不存在: {input_path}")
@@ -234,36 +469,91 @@ class AudioProcessor:
         if not output_dir:
             output_dir = os.path.dirname(input_path)
             
-        base_name = os.path.splitext(os.path.basename(input_path))[0]
-        # 输出模板: filename_part000.mp3
-        output_pattern = os.path.join(output_dir, f"{base_name}_part%03d.mp3")
+        base_name, ext = os.path.splitext(os.path.basename(input_path))
+        # 第一步输出: filename_seg000.<原扩展名>
+        segment_pattern = os.path.join(output_dir, f"{base_name}_seg%03d{ext}")
         
-        # 使用 ffmpeg segment 分割
-        # 强制转为 mp3 16k mono，适合 API
+        # 使用 ffmpeg segment 流复制分割
         # 针对 2013 年老版本 FFmpeg 的极限兼容性命令
         # 注意：老版本 FFmpeg 对参数顺序极其敏感
         cmd = [
             'ffmpeg', '-y',
+            '-loglevel', 'error', '-nostats',
+            *self._thread_args,
             '-i', input_path,
             '-map', '0:a',        # [关键修复] 显式映射流，2013版FFmpeg必须项！
-            '-ar', '16000',
-            '-ac', '1',
-            '-acodec', 'libmp3lame', 
+            '-c', 'copy',
             '-f', 'segment',
-            '-segment_time', str(segment_seconds),
-            output_pattern
+        ]
+        if cut_points:
+            cmd += ['-segment_times', ','.join(f'{t:.3f}' for t in cut_points)]
+        else:
+            cmd += ['-segment_time', str(segment_seconds)]
+        cmd += [
+            '-segment_list', 'pipe:1',
+            '-segment_list_type', 'flat',
+            '-reset_timestamps', '1',
+            segment_pattern
         ]
         
+        # 实际编码在 ffmpeg 子进程中进行，线程池只负责等待，不受 GIL 限制
+        segments = []
+        pending = collections.deque()  # (片段输出路径, future)，按片段顺序
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=os.cpu_count() or 1)
         try:
-            subprocess.run(cmd, capture_output=True, check=True)
+            # 第二步输出: filename_part000.mp3
+            for line in proc.stdout:
+                self._check_cancel()
+                name = line.decode(errors='ignore').strip()
+                if not name:
+                    continue
+                seg = os.path.join(output_dir, os.path.basename(name))
+                chunk = os.path.join(output_dir, f"{base_name}_part{len(segments):03d}.mp3")
+                segments.append(seg)
+                pending.append((chunk, executor.submit(self._encode_chunk, seg, chunk)))
+                
+                # 产出已经转码完成的前缀片段，不阻塞切段
+                while pending and pending[0][1].done():
+                    chunk, future = pending.popleft()
+                    future.result()
+                    yield chunk
+            
+            stderr = proc.stderr.read()
+            if proc.wait() != 0:
+                raise Exception(f"音频切片失败: {stderr.decode(errors='ignore') or proc.returncode}")
+            
+            while pending:
+                chunk, future = pending.popleft()
+                future.result()
+                yield chunk
         except subprocess.CalledProcessError as e:
             raise Exception(f"音频切片失败: {e.stderr.decode() if e.stderr else str(e)}")
-        
-        # 收集生成的文件
-        import glob
-        search_pattern = os.path.join(output_dir, f"{base_name}_part???.mp3")
-        chunks = sorted(glob.glob(search_pattern))
-        return chunks
+        finally:
+            # 调用方提前结束或出错时终止切段进程
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+            proc.stdout.close()
+            proc.stderr.close()
+            executor.shutdown(wait=True, cancel_futures=True)
+            for seg in segments:
+                try:
+                    os.remove(seg)
+                except OSError:
+                    pass
+    
+    def _encode_chunk(self, segment_path: str, output_path: str):
+        """将单个切段转码为 API 友好的 16k mono MP3"""
+        cmd = [
+            'ffmpeg', '-y',
+            '-loglevel', 'error', '-nostats',
+            *self._thread_args,
+            '-i', segment_path,
+            *self._MP3_FLAGS,
+            output_path
+        ]
+        self._run_ffmpeg(cmd)
 
     def get_audio_duration(self, audio_path: str) -> float:
         """获取音频时长（秒）- 公共方法"""
@@ -1,14 +1,21 @@
 """
 视频下载模块
-使用yt-dlp下载Bilibili视频音频
+使用yt-dlp解析Bilibili视频，FFmpeg直接拉取音频流
 """
 import os
+import subprocess
 import tempfile
 from typing import Callable, Optional
 
 import yt_dlp
 
-from utils.helpers import ensure_dir, safe_filename
+from core.audio_processor import AudioProcessor
+from utils import cache
+from utils.helpers import ensure_dir, parse_bilibili_url, safe_filename
+
+
+# ffmpeg 拉流的网络读写超时 (微秒)
+_RW_TIMEOUT_US = 15_000_000
 
 
 class VideoDownloader:
@@ -24,7 +31,10 @@ class VideoDownloader:
         progress_callback: Optional[Callable[[float, str], None]] = None
     ) -> dict:
         """
-        下载视频 (包含音频)
+        下载视频音频
+        
+        只请求音频流 (优先 m4a)，由 yt-dlp 解析出直链后交给 ffmpeg 边下载边封装，
+        AAC 音频直接流复制，不落地完整视频容器；无法直连时回退到 yt-dlp 下载
         
         Args:
             url: Bilibili视频链接或BV/AV号
@@ -32,22 +42,27 @@ class VideoDownloader:
         
         Returns:
             dict: {
-                'video_path': 视频文件路径,
+                'video_path': 媒体文件路径 (通常为音频),
                 'title': 视频标题,
                 'duration': 时长(秒),
                 'thumbnail': 封面URL
             }
         """
-        # 构建完整URL
+        # 构建完整URL (完整链接原样保留，其中可能带有分P等参数)
+        base_url = url
         if not url.startswith('http'):
-            if url.upper().startswith('BV'):
-                base_url = f"https://www.bilibili.com/video/{url}"
-            elif url.lower().startswith('av'):
-                base_url = f"https://www.bilibili.com/video/{url}"
-            else:
-                base_url = url
-        else:
-            base_url = url
+            parsed = parse_bilibili_url(url)
+            if parsed:
+                base_url = parsed[1]
+            
+        # 命中本地缓存时直接复用之前下载的音频
+        cache_key = cache.make_key(base_url)
+        cached = self._load_cached(cache_key)
+        if cached:
+            print(f"  - 命中本地缓存: {cached['title']}")
+            if progress_callback:
+                progress_callback(55, "使用已缓存的音频")
+            return cached
             
         # 使用用户提供的 91vrchat 前缀直接获取视频文件
         url = f"https://biliplayer.91vrchat.com/player/?url={base_url}"
@@ -76,12 +91,15 @@ class VideoDownloader:
                     progress_callback(50, "下载完成，处理中...")
         
         ydl_opts = {
-            'format': 'best',
+            # 优先单文件的 m4a 音频流，可直接流复制而无需转码
+            'format': 'bestaudio[ext=m4a]/bestaudio/best',
             'outtmpl': os.path.join(self.output_dir, '%(title).50s.%(ext)s'),
             'progress_hooks': [progress_hook],
             'quiet': True,
             'no_warnings': True,
             'restrictfilenames': True,
+            # 回退下载路径: 只保留音频，'best' 表示尽量流复制原编码
+            'postprocessors': [{'key': 'FFmpegExtractAudio', 'preferredcodec': 'best'}],
         }
         
         try:
@@ -91,8 +109,8 @@ class VideoDownloader:
                 
                 print(f"  - 解析链接: {url}")
                 
-                # 获取视频信息
-                info = ydl.extract_info(url, download=True)
+                # 获取视频信息 (只解析，不下载)
+                info = ydl.extract_info(url, download=False)
                 
                 if info:
                     print(f"  - 视频标题: {info.get('title', 'Unknown')}")
@@ -103,28 +121,24 @@ class VideoDownloader:
                     result['duration'] = info.get('duration', 0)
                     result['thumbnail'] = info.get('thumbnail', '')
                     
-                    # 查找下载的视频文件
-                    safe_title = safe_filename(result['title'], 50)
-                    # 可能的扩展名
-                    exts = ['mp4', 'mkv', 'webm', 'flv']
+                    # 优先由 ffmpeg 直接拉取音频直链
+                    stream = self._resolve_audio_stream(info)
+                    if stream:
+                        output_base = os.path.join(
+                            self.output_dir,
+                            safe_filename(result['title'], 50)
+                        )
+                        try:
+                            result['video_path'] = self._stream_audio(
+                                stream, output_base,
+                                result['duration'], progress_callback
+                            )
+                        except (subprocess.CalledProcessError, OSError) as e:
+                            print(f"  - 直连拉流失败，回退到 yt-dlp 下载: {e}")
                     
-                    # 1. 尝试直接构造路径
-                    for ext in exts:
-                        p = os.path.join(self.output_dir, f"{safe_title}.{ext}")
-                        if os.path.exists(p):
-                            result['video_path'] = p
-                            break
-                    
-                    # 2. 如果没找到，尝试通过文件名查找 (有时候 yt-dlp 会处理文件名)
                     if not result['video_path']:
-                        # 简单的模糊匹配
-                        prefix = safe_title[:20] 
-                        for f in os.listdir(self.output_dir):
-                            if f.startswith(prefix) and any(f.endswith(e) for e in exts):
-                                full_path = os.path.join(self.output_dir, f)
-                                if os.path.getctime(full_path) > os.path.getctime(__file__):
-                                     result['video_path'] = full_path
-                                     break
+                        ie_result = ydl.process_ie_result(info, download=True)
+                        result['video_path'] = self._downloaded_path(ydl, ie_result)
 
                 if progress_callback:
                     progress_callback(55, "视频下载完成")
@@ -137,4 +151,138 @@ class VideoDownloader:
         if not result['video_path'] or not os.path.exists(result['video_path']):
             raise Exception("视频文件未找到，下载可能失败")
         
+        if cache.put_file('download', cache_key, result['video_path']):
+            cache.put_json('download', cache_key, {
+                'title': result['title'],
+                'duration': result['duration'],
+                'thumbnail': result['thumbnail']
+            })
+        
         return result
+    
+    def _load_cached(self, cache_key: str) -> Optional[dict]:
+        """从缓存取出已下载的音频，链接到输出目录后返回下载结果"""
+        meta = cache.get_json('download', cache_key)
+        cached_path = cache.get_file('download', cache_key)
+        if not meta or not cached_path:
+            return None
+        
+        video_path = os.path.join(self.output_dir, os.path.basename(cached_path))
+        try:
+            cache.link_or_copy(cached_path, video_path)
+        except OSError:
+            return None
+        return {
+            'video_path': video_path,
+            'title': meta.get('title', ''),
+            'duration': meta.get('duration', 0),
+            'thumbnail': meta.get('thumbnail', '')
+        }
+    
+    @staticmethod
+    def _downloaded_path(ydl, info: dict) -> Optional[str]:
+        """
+        从 yt-dlp 下载结果中取得最终文件路径
+        
+        后处理器 (提取音频) 会更新 requested_downloads 中的 filepath，
+        没有该字段时按输出模板推导
+        """
+        downloads = info.get('requested_downloads')
+        if downloads and downloads[0].get('filepath'):
+            return downloads[0]['filepath']
+        return info.get('filepath') or ydl.prepare_filename(info)
+    
+    @staticmethod
+    def _resolve_audio_stream(info: dict) -> Optional[dict]:
+        """
+        从 yt-dlp 解析结果中取出可直连的音频格式
+        
+        Returns:
+            格式信息 (含 url / http_headers / acodec / ext)，无法直连时返回 None
+        """
+        formats = info.get('requested_formats')
+        if formats:
+            # 音视频分离的格式，挑出含音频的那一路
+            audio_formats = [f for f in formats if f.get('acodec') not in (None, 'none')]
+            if not audio_formats:
+                return None
+            selected = audio_formats[0]
+        else:
+            selected = info
+        
+        if not selected.get('url') or selected.get('protocol', 'https') not in ('http', 'https'):
+            return None
+        
+        stream = dict(selected)
+        stream['http_headers'] = selected.get('http_headers') or info.get('http_headers') or {}
+        return stream
+    
+    @staticmethod
+    def _stream_audio(
+        stream: dict,
+        output_base: str,
+        duration: float,
+        progress_callback: Optional[Callable[[float, str], None]] = None
+    ) -> str:
+        """
+        由 ffmpeg 直接通过 HTTP 拉取音频流
+        
+        AAC 音频 (B站 m4a) 直接流复制到 .m4a，只重新封装不触碰采样；
+        其他编码转码为 16k mono MP3。
+        -progress pipe:1 输出的 out_time_ms 用于换算下载进度
+        
+        Returns:
+            输出文件路径
+        """
+        acodec = stream.get('acodec') or ''
+        can_copy = acodec.startswith('mp4a') or (not acodec and stream.get('ext') == 'm4a')
+        
+        cmd = ['ffmpeg', '-y', '-loglevel', 'error', '-nostats']
+        headers = stream['http_headers']
+        if headers:
+            cmd += ['-headers', ''.join(f"{k}: {v}\r\n" for k, v in headers.items())]
+        # 网络读写超过 15 秒无响应时报错退出，卡住的 HTTP 流不会让下载无限等待 (单位: 微秒)
+        cmd += ['-rw_timeout', str(_RW_TIMEOUT_US), '-i', stream['url'], '-vn']
+        if can_copy:
+            output_path = f"{output_base}.m4a"
+            cmd += ['-c:a', 'copy']
+        else:
+            output_path = f"{output_base}.mp3"
+            cmd += [*AudioProcessor._MP3_FLAGS, '-b:a', '48k']
+        cmd += ['-progress', 'pipe:1', output_path]
+        
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        try:
+            for line in proc.stdout:
+                if not (progress_callback and duration and line.startswith(b'out_time_ms=')):
+                    continue
+                try:
+                    # out_time_ms 实际单位为微秒
+                    seconds = int(line.split(b'=', 1)[1]) / 1_000_000
+                except ValueError:
+                    continue
+                percent = min(seconds / duration * 100, 100)
+                # 回调可能抛出异常 (如用户取消)，由下方统一终止 ffmpeg 并清理
+                progress_callback(percent * 0.5, f"下载中: {percent:.1f}%")
+            
+            stderr = proc.stderr.read()
+            if proc.wait() != 0:
+                raise subprocess.CalledProcessError(proc.returncode, cmd, stderr=stderr)
+        except BaseException:
+            # 出错或被取消时终止 ffmpeg，并删除写了一半的输出文件
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+            try:
+                os.remove(output_path)
+            except OSError:
+                pass
+            raise
+        finally:
+            proc.stdout.close()
+            proc.stderr.close()
+        
+        if progress_callback:
+            progress_callback(50, "下载完成，处理中...")
+        
+        return output_path
@@ -2,9 +2,105 @@
 GPT总结模块
 调用OpenAI API生成三段式总结
 """
+import asyncio
+import re
 from typing import Callable, Optional
 
-from openai import OpenAI
+from openai import AsyncOpenAI, BadRequestError, OpenAI
+
+from utils import cache
+
+
+# 提示词版本，修改提示词后递增，使旧的总结缓存失效
+_PROMPT_VERSION = 3
+
+# 固定的指令放在 system 消息中作为前缀，每次调用字节完全一致，
+# 可命中 OpenAI 的自动 Prompt 缓存；变化的标题与转写内容放在 user 消息末尾
+_SYSTEM_PROMPT = """你是一个专业的内容分析助手，擅长总结和评价视频内容。请用中文回复。
+
+请根据用户提供的视频标题与转写内容，生成极简、深刻的结构化总结。
+转写内容仅供理解，严禁在回复中重复原文。
+
+请严格按照以下 3 个部分输出，严禁输出第四部分，严禁重复原文内容：
+
+## 一、主要内容与主观评价
+简要概述（2-3句话）。然后主观评价这视频有用吗还是只是消遣还是很有价值还是将信将疑还是什么...
+
+## 二、内容概述
+按视频逻辑主线，重新理一遍视频大概说了什么内容。每部分一句话。
+
+## 三、价值内容
+总结该视频带来的道理、方法论或启示。
+
+---
+注意：请直接开始输出 MARKDOWN 内容。严禁重复转写文稿中的原话！"""
+_USER_TEMPLATE = "视频标题：{title}\n\n转写内容：\n{transcript}"
+
+# 转写内容超出模型上下文时先分段提炼要点 (并发请求)，再由要点生成最终总结
+_PART_SYSTEM_PROMPT = """你是一个专业的内容分析助手。请用中文回复。
+
+用户会提供某个视频的标题与其转写内容中的一段。
+请按原有顺序提炼这一段的主要观点、论据与结论，使用简洁的 Markdown 列表，不超过 500 字。
+严禁重复原文，直接输出要点。"""
+_PART_USER_TEMPLATE = "视频标题：{title}\n\n转写内容 (第 {index}/{total} 段)：\n{transcript}"
+_PART_MAX_TOKENS = 800
+_PART_CONCURRENCY = 8  # 同时进行的分段请求上限，避免触发速率限制
+
+# 各模型的上下文窗口 (tokens)，按模型名前缀匹配 (按顺序匹配，更具体的前缀在前)
+_CONTEXT_WINDOWS = (
+    ('gpt-4o', 128_000),
+    ('gpt-4-turbo', 128_000),
+    ('gpt-4.1', 1_000_000),
+    ('gpt-4-1106', 128_000),
+    ('gpt-4-0125', 128_000),
+    ('gpt-4-32k', 32_768),
+    ('gpt-4', 8_192),
+    ('gpt-3.5-turbo', 16_385),
+    ('o1', 128_000),
+    ('o3', 200_000),
+)
+_DEFAULT_CONTEXT_WINDOW = 16_000  # 未知模型使用保守值
+_MAX_COMPLETION_TOKENS = 2000
+_PROMPT_OVERHEAD_TOKENS = 1000  # 指令、标题与消息格式的预留
+_FALLBACK_MAX_CHARS = 15000  # 未安装 tiktoken 时按字符截断
+
+# 二级标题章节: "## 标题\n正文"，正文截止到下一个二级标题或文本末尾
+_SECTION_RE = re.compile(r'^##[ \t]*([^\n]*)\n?(.*?)(?=^##\s|\Z)', re.DOTALL | re.MULTILINE)
+# 结果字段 -> 标题中的识别关键字
+_SECTION_KEYS = (
+    ('summary', ('主要内容', '一、')),
+    ('outline', ('内容概述', '二、')),
+    ('value_content', ('价值内容', '三、')),
+)
+
+# 模型名 -> tiktoken 编码器 (None 表示 tiktoken 不可用)
+_ENCODINGS: dict = {}
+
+
+def _get_encoding(model: str):
+    """获取模型对应的 tiktoken 编码器，按模型缓存"""
+    if model not in _ENCODINGS:
+        try:
+            import tiktoken
+        except ImportError:
+            _ENCODINGS[model] = None
+            return None
+        try:
+            _ENCODINGS[model] = tiktoken.encoding_for_model(model)
+        except KeyError:
+            # 第三方或新模型名，使用 GPT-4o 系列的编码
+            _ENCODINGS[model] = tiktoken.get_encoding('o200k_base')
+    return _ENCODINGS[model]
+
+
+def _transcript_token_budget(model: str) -> int:
+    """转写内容可用的 token 预算"""
+    window = _DEFAULT_CONTEXT_WINDOW
+    for prefix, size in _CONTEXT_WINDOWS:
+        if model.startswith(prefix):
+            window = size
+            break
+    return window - _MAX_COMPLETION_TOKENS - _PROMPT_OVERHEAD_TOKENS
 
 
 class Summarizer:
@@ -18,9 +114,11 @@ class Summarizer:
             api_key: OpenAI API Key
             base_url: API基础URL（可选，用于第三方服务）
         """
+        self.api_key = api_key
+        self.base_url = base_url if base_url else None
         self.client = OpenAI(
             api_key=api_key,
-            base_url=base_url if base_url else None
+            base_url=self.base_url
         )
     
     def generate_summary(
@@ -49,80 +147,231 @@ class Summarizer:
         if progress_callback:
             progress_callback(92, "正在生成总结...")
         
-        # 限制转写文本长度（避免超出token限制）
-        max_chars = 15000
-        truncated_transcript = transcript[:max_chars]
-        if len(transcript) > max_chars:
-            truncated_transcript += "\n...[内容已截断]..."
-        
-        prompt = f"""请根据以下视频转写内容，生成极简、深刻的结构化总结。
-        
-        视频标题：{video_title}
-        
-        转写内容（仅供理解，严禁在回复中重复原文）：
-        {truncated_transcript}
-        
-        请严格按照以下 3 个部分输出，严禁输出第四部分，严禁重复原文内容：
-        
-        ## 一、主要内容与主观评价
-        简要概述（2-3句话）。然后主观评价这视频有用吗还是只是消遣还是很有价值还是将信将疑还是什么...
-        
-        ## 二、内容概述
-        按视频逻辑主线，重新理一遍视频大概说了什么内容。每部分一句话。
-        
-        ## 三、价值内容
-        总结该视频带来的道理、方法论或启示。
+        # 相同转写内容 + 标题 + 模型 + 提示词版本的总结直接从缓存返回
+        cache_key = cache.make_key(transcript, video_title, model, _PROMPT_VERSION)
+        cached = cache.get_json('summary', cache_key)
+        if cached:
+            if progress_callback:
+                progress_callback(98, "使用已缓存的总结")
+            cached['transcript'] = transcript
+            return cached
         
-        ---
-        注意：请直接开始输出 MARKDOWN 内容。严禁重复转写文稿中的原话！"""
-
         try:
-            # 构造请求参数
-            params = {
-                "model": model,
-                "messages": [
-                    {
-                        "role": "system",
-                        "content": "你是一个专业的内容分析助手，擅长总结和评价视频内容。请用中文回复。"
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                "temperature": 1.0,
-                "max_completion_tokens": 2000  # 使用新版参数名以兼容 o1 等模型
-            }
-            
-            # OpenAI o1 系列模型不支持 temperature 参数，如果用户输入的是 o1 开头的模型则移除
-            if model.startswith("o1"):
-                params.pop("temperature", None)
-
-            response = self.client.chat.completions.create(**params)
+            # 超出上下文预算的长转写不再截断丢弃后半部分：各段并发提炼要点，耗时约等于单次请求
+            parts = self._split_transcript(transcript, model)
+            usages = []
+            source = transcript
+            if len(parts) > 1:
+                notes = self._summarize_parts(parts, video_title, model, progress_callback)
+                usages = [usage for _, usage in notes]
+                source = "\n\n".join(
+                    f"### 第 {i + 1} 段要点\n{text}" for i, (text, _) in enumerate(notes)
+                )
             
-            summary_text = response.choices[0].message.content.strip()
+            params = self._build_params(source, video_title, model)
+            summary_text, usage = self._complete(params, progress_callback)
             
             if progress_callback:
                 progress_callback(98, "总结生成完成")
             
-            # 解析生成的内容
-            result = self._parse_summary(summary_text)
-            result['transcript'] = transcript
-            
-            # 添加 token 使用统计
-            if response.usage:
-                u = response.usage
-                result['usage'] = {
-                    'prompt_tokens': getattr(u, 'prompt_tokens', 0) or getattr(u, 'input_tokens', 0),
-                    'completion_tokens': getattr(u, 'completion_tokens', 0) or getattr(u, 'output_tokens', 0),
-                    'total_tokens': getattr(u, 'total_tokens', 0)
-                }
-            
+            result = self._build_result(summary_text, transcript, usage, usages)
+            cache.put_json('summary', cache_key, {k: v for k, v in result.items() if k != 'transcript'})
             return result
             
         except Exception as e:
             raise Exception(f"GPT API调用失败: {str(e)}")
     
+    def _summarize_parts(
+        self,
+        parts: list,
+        video_title: str,
+        model: str,
+        progress_callback: Optional[Callable[[float, str], None]] = None
+    ) -> list:
+        """
+        并发提炼各段转写的要点，返回与 parts 顺序一致的 (要点文本, usage) 列表
+        
+        各段请求互不依赖，用 asyncio.gather 同时发出，Semaphore 限制并发数
+        """
+        total = len(parts)
+        if progress_callback:
+            progress_callback(92, f"转写内容较长，分 {total} 段提炼要点...")
+        
+        async def run_all():
+            # 异步客户端绑定事件循环，每次 asyncio.run 都新建并在结束时关闭
+            client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url)
+            semaphore = asyncio.Semaphore(_PART_CONCURRENCY)
+            done = 0
+            
+            async def summarize_part(index: int, text: str):
+                nonlocal done
+                async with semaphore:
+                    response = await client.chat.completions.create(
+                        **self._build_part_params(text, video_title, model, index, total)
+                    )
+                done += 1
+                if progress_callback:
+                    progress_callback(92, f"分段提炼要点... ({done}/{total})")
+                return (response.choices[0].message.content or "").strip(), response.usage
+            
+            try:
+                return await asyncio.gather(*(summarize_part(i, t) for i, t in enumerate(parts)))
+            finally:
+                await client.close()
+        
+        return asyncio.run(run_all())
+    
+    def _complete(
+        self,
+        params: dict,
+        progress_callback: Optional[Callable[[float, str], None]] = None
+    ) -> tuple:
+        """
+        请求生成总结，返回 (总结文本, usage)
+        
+        优先流式接收并汇报进度；部分兼容 OpenAI 的第三方服务不支持 stream_options
+        或流式输出，被拒绝 (400) 时依次退回不带 stream_options 的流式请求与普通请求
+        """
+        try:
+            return self._complete_stream(
+                {**params, "stream": True, "stream_options": {"include_usage": True}},
+                progress_callback
+            )
+        except BadRequestError:
+            pass
+        try:
+            return self._complete_stream({**params, "stream": True}, progress_callback)
+        except BadRequestError:
+            pass
+        response = self.client.chat.completions.create(**params)
+        return (response.choices[0].message.content or "").strip(), response.usage
+    
+    def _complete_stream(
+        self,
+        params: dict,
+        progress_callback: Optional[Callable[[float, str], None]] = None
+    ) -> tuple:
+        """流式接收总结，边生成边汇报进度；usage 在最后一个 chunk 中返回 (服务支持时)"""
+        response = self.client.chat.completions.create(**params)
+        
+        parts = []
+        received_chars = 0
+        usage = None
+        for chunk in response:
+            if getattr(chunk, 'usage', None):
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            parts.append(delta)
+            received_chars += len(delta)
+            if progress_callback and len(parts) % 10 == 0:
+                progress_callback(
+                    92 + min(6, received_chars / 500),
+                    f"生成总结中... (已生成 {received_chars} 字)"
+                )
+        
+        return "".join(parts).strip(), usage
+    
+    def _build_params(self, transcript: str, video_title: str, model: str) -> dict:
+        """构造 chat.completions 请求参数"""
+        # 按 token 预算截断转写文本（避免超出上下文限制）
+        truncated_transcript = self._truncate_transcript(transcript, model)
+        
+        user_prompt = _USER_TEMPLATE.format(title=video_title, transcript=truncated_transcript)
+        
+        params = {
+            "model": model,
+            "messages": [
+                {
+                    "role": "system",
+                    "content": _SYSTEM_PROMPT
+                },
+                {
+                    "role": "user",
+                    "content": user_prompt
+                }
+            ],
+            "temperature": 1.0,
+            "max_completion_tokens": _MAX_COMPLETION_TOKENS  # 使用新版参数名以兼容 o1 等模型
+        }
+        
+        # OpenAI o1 系列模型不支持 temperature 参数，如果用户输入的是 o1 开头的模型则移除
+        if model.startswith("o1"):
+            params.pop("temperature", None)
+        
+        return params
+    
+    @staticmethod
+    def _build_part_params(transcript: str, video_title: str, model: str, index: int, total: int) -> dict:
+        """构造单段要点提炼的请求参数 (各段已在预算内，不再截断)"""
+        params = {
+            "model": model,
+            "messages": [
+                {
+                    "role": "system",
+                    "content": _PART_SYSTEM_PROMPT
+                },
+                {
+                    "role": "user",
+                    "content": _PART_USER_TEMPLATE.format(
+                        title=video_title, index=index + 1, total=total, transcript=transcript
+                    )
+                }
+            ],
+            "temperature": 1.0,
+            "max_completion_tokens": _PART_MAX_TOKENS
+        }
+        if model.startswith("o1"):
+            params.pop("temperature", None)
+        return params
+    
+    def _build_result(self, summary_text: str, transcript: str, usage, part_usages: Optional[list] = None) -> dict:
+        """解析总结文本并附加 token 使用统计 (part_usages: 分段提炼请求的用量，一并计入)"""
+        result = self._parse_summary(summary_text)
+        result['transcript'] = transcript
+        
+        usages = [u for u in (*(part_usages or ()), usage) if u]
+        if usages:
+            result['usage'] = {
+                'prompt_tokens': sum(getattr(u, 'prompt_tokens', 0) or getattr(u, 'input_tokens', 0) or 0 for u in usages),
+                'completion_tokens': sum(getattr(u, 'completion_tokens', 0) or getattr(u, 'output_tokens', 0) or 0 for u in usages),
+                'total_tokens': sum(getattr(u, 'total_tokens', 0) or 0 for u in usages)
+            }
+        
+        return result
+    
+    @staticmethod
+    def _split_transcript(transcript: str, model: str) -> list:
+        """按模型的 token 预算把转写文本切成若干段，预算内时原样返回单段"""
+        enc = _get_encoding(model)
+        if enc is None:
+            step = _FALLBACK_MAX_CHARS
+            return [transcript[i:i + step] for i in range(0, len(transcript), step)] or [transcript]
+        
+        budget = _transcript_token_budget(model)
+        ids = enc.encode(transcript, disallowed_special=())
+        if len(ids) <= budget:
+            return [transcript]
+        return [enc.decode(ids[i:i + budget]) for i in range(0, len(ids), budget)]
+    
+    @staticmethod
+    def _truncate_transcript(transcript: str, model: str) -> str:
+        """按模型的 token 预算截断转写文本，未安装 tiktoken 时按字符数截断"""
+        enc = _get_encoding(model)
+        if enc is None:
+            if len(transcript) <= _FALLBACK_MAX_CHARS:
+                return transcript
+            return transcript[:_FALLBACK_MAX_CHARS] + "\n...[内容已截断]..."
+        
+        budget = _transcript_token_budget(model)
+        ids = enc.encode(transcript, disallowed_special=())
+        if len(ids) <= budget:
+            return transcript
+        return enc.decode(ids[:budget]) + "\n...[内容已截断]..."
+    
     def _parse_summary(self, text: str) -> dict:
         """解析GPT生成的总结"""
         result = {
@@ -132,35 +381,12 @@ class Summarizer:
             'transcript': ''
         }
         
-        # 尝试按章节分割
-        sections = text.split('## ')
-        
-        for section in sections:
-            section = section.strip()
-            if not section:
-                continue
-            
-            if '主要内容' in section or '一、' in section:
-                # 移除标题行
-                lines = section.split('\n', 1)
-                if len(lines) > 1:
-                    result['summary'] = lines[1].strip()
-                else:
-                    result['summary'] = section
-            
-            elif '内容概述' in section or '二、' in section:
-                lines = section.split('\n', 1)
-                if len(lines) > 1:
-                    result['outline'] = lines[1].strip()
-                else:
-                    result['outline'] = section
-
-            elif '价值内容' in section or '三、' in section:
-                lines = section.split('\n', 1)
-                if len(lines) > 1:
-                    result['value_content'] = lines[1].strip()
-                else:
-                    result['value_content'] = section
+        # 一次正则扫描取出所有章节，再按标题归类
+        for title, body in _SECTION_RE.findall(text):
+            for key, markers in _SECTION_KEYS:
+                if not result[key] and any(m in title for m in markers):
+                    result[key] = body.strip()
+                    break
         
         # 如果解析失败，使用完整文本
         if not result['summary'] and not result['outline']:
@@ -3,10 +3,147 @@
 使用OpenAI Whisper进行本地语音转文字
 """
 import os
-import torch
-import whisper
-from typing import Callable, Optional
+import asyncio
 import concurrent.futures
+import mmap
+import mimetypes
+import random
+import ssl
+import heapq
+import subprocess
+import tempfile
+import threading
+import time
+from typing import Callable, Optional
+
+from utils import cache
+
+# torch / whisper 导入需要数秒 (CUDA 探测与大量动态库加载)，
+# 只在使用本地模型时由 _import_local_backend() 按需导入，纯 API 转写无需承担
+torch = None
+whisper = None
+
+
+# ============================================================
+# SSL 证书验证修复 (解决 macOS/Proxy 下模型下载失败问题)
+# 只在下载 Whisper 模型期间关闭证书验证，不影响 API 等其他 HTTPS 连接
+# ============================================================
+_SSL_PATCH_LOCK = threading.Lock()
+
+
+def _patch_whisper_download():
+    """包装 whisper._download，下载模型时临时使用不验证证书的 HTTPS 上下文"""
+    original_download = whisper._download
+    if getattr(original_download, '_ssl_patched', False):
+        return
+    
+    def _download(*args, **kwargs):
+        with _SSL_PATCH_LOCK:
+            original_context = ssl._create_default_https_context
+            ssl._create_default_https_context = ssl._create_unverified_context
+            try:
+                return original_download(*args, **kwargs)
+            finally:
+                ssl._create_default_https_context = original_context
+    
+    _download._ssl_patched = True
+    whisper._download = _download
+
+
+def _apply_pytorch_patch():
+    """
+    PyTorch 2.6+ 兼容性补丁
+    解决 Whisper 模型加载时 weights_only=True 导致的错误
+    (whisper 在调用时才查找 torch.load，导入 torch 后打补丁即可生效)
+    """
+    import torch.serialization
+    
+    # 保存原始函数
+    _original_torch_load = torch.load
+    
+    # 创建兼容版本
+    def _patched_load(*args, **kwargs):
+        # 强制设置 weights_only=False
+        kwargs['weights_only'] = False
+        return _original_torch_load(*args, **kwargs)
+    
+    # 替换 torch.load
+    torch.load = _patched_load
+    
+    # 同时替换 torch.serialization.load (某些库直接使用这个)
+    if hasattr(torch.serialization, 'load'):
+        torch.serialization.load = _patched_load
+
+
+def _import_local_backend():
+    """按需导入 torch 与 whisper (导入到模块全局，后续直接使用)"""
+    global torch, whisper
+    if whisper is None:
+        import torch
+        _apply_pytorch_patch()
+        import whisper
+        _patch_whisper_download()
+
+
+# 进程内已加载的本地模型: (模型名, 设备) -> Whisper，多个 Transcriber 实例共用
+_MODEL_CACHE: dict = {}
+
+# MPS 上 fp16 是否可用 (部分算子会产生 NaN)，进程内只探测一次
+_MPS_FP16_OK: Optional[bool] = None
+
+# 本地批量解码: 每批片段数 (受显存限制)，以及启用批量解码的最少片段数
+_LOCAL_BATCH_SIZE = 8
+_LOCAL_BATCH_MIN_SEGMENTS = 4
+
+# 分片转写的默认并发上传数，可通过环境变量 BILI_TRANSCRIBE_CONCURRENCY 调整
+_CHUNK_WORKERS = int(os.environ.get('BILI_TRANSCRIBE_CONCURRENCY', '8'))
+# 遇到速率限制 (429)、连接错误或服务端错误时单个片段的最大重试次数
+# (分片客户端关闭了 SDK 自带的重试，避免两层重试次数相乘)
+_RATE_LIMIT_RETRIES = 3
+
+# 时间戳格式化 "分:秒"，参数为 (分, 秒) 元组
+_TIME_FMT = "%02d:%02d".__mod__
+
+
+def _http_transport_options(max_workers: int) -> dict:
+    """
+    API 客户端 HTTP 连接池参数
+    
+    连接池大小与分片并发数匹配，各分片上传复用已建立的 TLS 连接；
+    安装了 h2 时启用 HTTP/2，并发请求复用同一条 TCP 连接
+    """
+    import importlib.util
+    import httpx
+    
+    return {
+        'http2': importlib.util.find_spec('h2') is not None,
+        'limits': httpx.Limits(
+            max_keepalive_connections=max_workers,
+            max_connections=max_workers * 2
+        ),
+        'retries': 2,  # 仅重试连接失败
+    }
+
+
+def _make_http_client(max_workers: int = _CHUNK_WORKERS):
+    """创建同步 API 客户端使用的 HTTP 连接池"""
+    import httpx
+    
+    return httpx.Client(
+        transport=httpx.HTTPTransport(**_http_transport_options(max_workers)),
+        timeout=httpx.Timeout(600.0, connect=30.0)
+    )
+
+
+def _make_async_http_client(max_workers: int = _CHUNK_WORKERS):
+    """创建异步 API 客户端使用的 HTTP 连接池 (分片并发转写)"""
+    import httpx
+    
+    return httpx.AsyncClient(
+        transport=httpx.AsyncHTTPTransport(**_http_transport_options(max_workers)),
+        timeout=httpx.Timeout(600.0, connect=30.0)
+    )
+
 
 class Transcriber:
     """语音转写器"""
@@ -17,7 +154,19 @@ class Transcriber:
         'gpt-4o-transcribe', 'gpt-4o-mini-transcribe', 'whisper-1'
     ]
     
-    def __init__(self, model_name_or_path: str = 'base', api_key: Optional[str] = None, base_url: Optional[str] = None):
+    # 本地转写后端
+    BACKENDS = ['whisper', 'faster-whisper']
+    
+    def __init__(
+        self,
+        model_name_or_path: str = 'base',
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        backend: Optional[str] = None,
+        concurrency: Optional[int] = None,
+        batched_decode: bool = False,
+        cancel: Optional[threading.Event] = None
+    ):
         """
         初始化转写器
         
@@ -25,17 +174,40 @@ class Transcriber:
             model_name_or_path: 模型名称或路径
             api_key: OpenAI API Key (如果使用API转写则必须)
             base_url: OpenAI Base URL
+            backend: 本地转写后端 ('whisper' / 'faster-whisper')，
+                     不指定时仅在强制 CPU 模式 (FORCE_CPU=1) 下、已安装 faster-whisper 时自动使用
+            concurrency: 分片转写的并发上传数 (默认 8，或环境变量 BILI_TRANSCRIBE_CONCURRENCY)
+            batched_decode: 本地 whisper 按 VAD 切段批量解码 (GPU 上更快，但不输出逐句时间戳、
+                            无温度回退与上文衔接，识别质量可能略低)，默认关闭
+            cancel: 取消事件，交给内部的音频处理器，设置后立即结束切片/压缩用的 ffmpeg 子进程
         """
         self.model = None
         self.model_name = model_name_or_path
         self.api_key = api_key
         self.base_url = base_url
+        self.backend = backend
+        self.concurrency = max(1, concurrency or _CHUNK_WORKERS)
+        self.batched_decode = batched_decode
+        self.cancel = cancel
         self.client = None
+        # 速率限制冷却截止时间，所有分片共用，避免退避结束后同时重试再次触发 429
+        self._rate_limit_until = 0.0
+        self._audio_processor = None
+        self._fp16 = False
+        self._backend = 'torch'  # 实际使用的后端: torch / ct2
         
         # 兼容 turbo 名称
         if self.model_name == 'turbo':
             self.model_name = 'large-v3-turbo'
 
+    @property
+    def audio_processor(self):
+        """API 转写用到的音频处理器 (首次使用时创建，之后复用)"""
+        if self._audio_processor is None:
+            from core.audio_processor import AudioProcessor
+            self._audio_processor = AudioProcessor(cancel=self.cancel)
+        return self._audio_processor
+
     def _is_api_model(self):
         """检查是否是API模型"""
         return self.model_name in ['gpt-4o-transcribe', 'gpt-4o-mini-transcribe', 'whisper-1']
@@ -50,7 +222,11 @@ class Transcriber:
                 raise ValueError("使用在线转写模型需要提供 API Key")
             if self.client is None:
                 from openai import OpenAI
-                self.client = OpenAI(api_key=self.api_key, base_url=self.base_url)
+                self.client = OpenAI(
+                    api_key=self.api_key,
+                    base_url=self.base_url,
+                    http_client=_make_http_client(self.concurrency)
+                )
             return
 
         if self.model is not None:
@@ -60,6 +236,8 @@ class Transcriber:
             progress_callback(75, f"加载模型: {self.model_name}...")
         
         try:
+            _import_local_backend()
+            
             # 确定设备
             # 允许通过环境变量强制使用 CPU
             if os.environ.get('FORCE_CPU', '0') == '1':
@@ -72,9 +250,24 @@ class Transcriber:
             
             print(f"✓ Whisper 运行设备: {device.upper()}")
             
-            # 加载模型
-            # in_memory=True 可以稍微加速加载，但费内存
-            self.model = whisper.load_model(self.model_name, device=device)
+            if self._use_faster_whisper():
+                self._load_faster_whisper(device)
+                if progress_callback:
+                    progress_callback(80, "模型加载完成")
+                return
+            
+            # 加载模型 (优先进程内缓存，其次 mmap 映射已下载的权重，最后常规加载/下载)
+            key = (self.model_name, device)
+            self.model = _MODEL_CACHE.get(key)
+            if self.model is None:
+                self._remove_legacy_model_copies()
+                self.model = self._load_model_mmap(device)
+            if self.model is None:
+                self.model = whisper.load_model(self.model_name, device=device)
+            _MODEL_CACHE[key] = self.model
+            
+            self._fp16 = self._fp16_supported(device)
+            self._preload_decoding_assets()
             
             if progress_callback:
                 progress_callback(80, "模型加载完成")
@@ -82,32 +275,382 @@ class Transcriber:
         except Exception as e:
             raise Exception(f"模型加载失败: {str(e)}")
     
+    def _use_faster_whisper(self) -> bool:
+        """是否使用 faster-whisper (CTranslate2) 后端"""
+        if self.backend == 'faster-whisper':
+            return True
+        if self.backend == 'whisper' or os.environ.get('FORCE_CPU', '0') != '1':
+            return False
+        # 自动模式 (仅强制 CPU 时): CPU 上 CTranslate2 int8 推理比 PyTorch fp32 快数倍；自定义模型文件不适用
+        if os.path.isfile(self.model_name):
+            return False
+        import importlib.util
+        return importlib.util.find_spec('faster_whisper') is not None
+    
+    def _resolved_backend(self) -> str:
+        """实际使用的转写方式 (api / whisper / whisper-batched / faster-whisper)，用于区分转写缓存"""
+        if self._is_api_model():
+            return 'api'
+        if self._use_faster_whisper():
+            return 'faster-whisper'
+        return 'whisper-batched' if self.batched_decode else 'whisper'
+    
+    def _load_faster_whisper(self, device: str):
+        """加载 faster-whisper 模型 (CPU 使用 int8，CUDA 使用 fp16)"""
+        try:
+            from faster_whisper import WhisperModel
+        except ImportError:
+            raise ImportError("未安装 faster-whisper，请运行: pip install faster-whisper")
+        
+        # CTranslate2 不支持 MPS
+        ct2_device = 'cuda' if device == 'cuda' else 'cpu'
+        key = (self.model_name, f'ct2-{ct2_device}')
+        self.model = _MODEL_CACHE.get(key)
+        if self.model is None:
+            self.model = WhisperModel(
+                self.model_name,
+                device=ct2_device,
+                compute_type='float16' if ct2_device == 'cuda' else 'int8'
+            )
+            _MODEL_CACHE[key] = self.model
+        self._backend = 'ct2'
+        print(f"✓ 使用 faster-whisper 后端 ({ct2_device.upper()})")
+    
+    def _transcribe_faster_whisper(
+        self,
+        audio_path: str,
+        language: Optional[str],
+        progress_callback: Optional[Callable[[float, str], None]] = None
+    ) -> dict:
+        """使用 faster-whisper 转写 (内置 VAD 过滤静音，贪心解码)"""
+        segments_iter, info = self.model.transcribe(
+            audio_path,
+            language=language,
+            vad_filter=True,
+            beam_size=1
+        )
+        segments = []
+        for seg in segments_iter:
+            segments.append({'start': seg.start, 'end': seg.end, 'text': seg.text})
+            if progress_callback and info.duration:
+                progress_callback(
+                    82 + min(seg.end / info.duration, 1) * 16,
+                    f"本地转写中... ({seg.end:.0f}/{info.duration:.0f}s)"
+                )
+        return {
+            'text': ''.join(seg['text'] for seg in segments),
+            'language': info.language,
+            'segments': segments
+        }
+
+    @staticmethod
+    def _vad_spans(audio, max_seconds: float = 30, min_seconds: float = 10) -> Optional[list]:
+        """
+        用 WebRTC VAD 将音频切成不超过 max_seconds 的片段
+        
+        每段尽量在 [min_seconds, max_seconds] 区间内最后一个静音处 (≥100ms) 结束，
+        找不到静音时硬切；未安装 webrtcvad 时返回 None
+        
+        Returns:
+            [(起始秒, 结束秒), ...]
+        """
+        try:
+            import webrtcvad
+        except ImportError:
+            return None
+        
+        sample_rate = whisper.audio.SAMPLE_RATE
+        frame_ms = 30
+        frame_len = sample_rate * frame_ms // 1000
+        min_silence_frames = -(-100 // frame_ms)
+        
+        pcm = (audio.clip(-1, 1) * 32767).astype('<i2').tobytes()
+        vad = webrtcvad.Vad(2)
+        silences = []
+        run = 0
+        n_frames = len(audio) // frame_len
+        for k in range(n_frames):
+            frame = pcm[k * frame_len * 2:(k + 1) * frame_len * 2]
+            if vad.is_speech(frame, sample_rate):
+                if run >= min_silence_frames:
+                    silences.append((k - run / 2) * frame_ms / 1000)
+                run = 0
+            else:
+                run += 1
+        
+        duration = len(audio) / sample_rate
+        spans = []
+        start = 0.0
+        i = 0
+        while duration - start > max_seconds:
+            end = start + max_seconds
+            while i < len(silences) and silences[i] <= start + min_seconds:
+                i += 1
+            j = i
+            while j < len(silences) and silences[j] <= end:
+                j += 1
+            if j > i:
+                end = silences[j - 1]
+            spans.append((start, end))
+            start = end
+        spans.append((start, duration))
+        return spans
+    
+    def _transcribe_local_batched(
+        self,
+        audio_path: str,
+        language: Optional[str],
+        progress_callback: Optional[Callable[[float, str], None]] = None
+    ) -> Optional[dict]:
+        """
+        本地模型批量解码
+        
+        将音频按 VAD 切成 ≤30s 的片段，每批片段的 log-mel 堆叠后一次 decode，
+        GPU 上可以并行处理多个片段；片段数不足或不具备条件时返回 None
+        """
+        audio = whisper.load_audio(audio_path)
+        spans = self._vad_spans(audio)
+        if not spans or len(spans) < _LOCAL_BATCH_MIN_SEGMENTS:
+            return None
+        
+        sample_rate = whisper.audio.SAMPLE_RATE
+        device = self.model.device
+        n_mels = self.model.dims.n_mels
+        
+        def batch_mels(batch):
+            return torch.stack([
+                whisper.log_mel_spectrogram(
+                    whisper.pad_or_trim(torch.from_numpy(audio[int(s * sample_rate):int(e * sample_rate)])),
+                    n_mels=n_mels,
+                    device=device
+                )
+                for s, e in batch
+            ])
+        
+        print(f"🚀 本地批量解码: {len(spans)} 个片段 (每批 {_LOCAL_BATCH_SIZE})")
+        segments = []
+        with torch.no_grad():
+            for b in range(0, len(spans), _LOCAL_BATCH_SIZE):
+                batch = spans[b:b + _LOCAL_BATCH_SIZE]
+                mels = batch_mels(batch)
+                if self._fp16:
+                    mels = mels.half()
+                
+                # 未指定语言时用第一个片段检测一次，整段音频保持一致
+                if language is None:
+                    _, probs = self.model.detect_language(mels[:1])
+                    language = max(probs[0], key=probs[0].get)
+                
+                options = whisper.DecodingOptions(
+                    task='transcribe',
+                    language=language,
+                    fp16=self._fp16,
+                    without_timestamps=True
+                )
+                for (s, e), r in zip(batch, whisper.decode(self.model, mels, options)):
+                    segments.append({'start': s, 'end': e, 'text': r.text})
+                
+                if progress_callback:
+                    done = min(b + _LOCAL_BATCH_SIZE, len(spans))
+                    progress_callback(82 + done / len(spans) * 16, f"本地转写中... ({done}/{len(spans)})")
+        
+        return {
+            'text': ''.join(seg['text'] for seg in segments),
+            'language': language,
+            'segments': segments
+        }
+
+    def _preload_decoding_assets(self):
+        """
+        预先加载 mel 滤波器组与分词器
+        
+        两者在 whisper 内部均有 lru_cache，这里在加载模型时提前触发，
+        首次转写不再承担读取滤波器文件与 tiktoken 词表的开销
+        """
+        try:
+            whisper.audio.mel_filters(self.model.device, self.model.dims.n_mels)
+            whisper.tokenizer.get_tokenizer(
+                self.model.is_multilingual,
+                num_languages=self.model.num_languages,
+                task='transcribe'
+            )
+        except Exception as e:
+            print(f"⚠️ 预加载分词器失败 (不影响转写): {e}")
+
+    def _fp16_supported(self, device: str) -> bool:
+        """
+        判断当前设备能否使用 fp16 推理
+        
+        CPU 不支持 fp16；MPS 上用一段静音跑一次 fp16 编码器，
+        输出出现 NaN 则本进程内改用 fp32，避免长音频转写到一半才出错
+        """
+        global _MPS_FP16_OK
+        if device == 'cpu':
+            return False
+        if device != 'mps':
+            return True
+        if _MPS_FP16_OK is None:
+            try:
+                with torch.no_grad():
+                    mel = whisper.log_mel_spectrogram(
+                        whisper.pad_or_trim(torch.zeros(whisper.audio.SAMPLE_RATE)),
+                        n_mels=self.model.dims.n_mels
+                    )
+                    out = self.model.encoder(mel.unsqueeze(0).to(device, torch.float16))
+                    _MPS_FP16_OK = not bool(torch.isnan(out).any())
+            except Exception as e:
+                print(f"⚠️ fp16 检测失败: {e}")
+                _MPS_FP16_OK = False
+            if not _MPS_FP16_OK:
+                print("⚠️ MPS fp16 输出 NaN，本次运行改用 fp32")
+        return _MPS_FP16_OK
+
+    def _checkpoint_path(self) -> Optional[str]:
+        """模型权重文件路径: 官方模型为 whisper 自身的下载缓存，自定义模型为其文件路径"""
+        if self.model_name in whisper.available_models():
+            # 与 whisper.load_model 的默认下载目录一致
+            download_root = os.path.join(
+                os.getenv('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache')),
+                'whisper'
+            )
+            return os.path.join(download_root, os.path.basename(whisper._MODELS[self.model_name]))
+        return self.model_name if os.path.isfile(self.model_name) else None
+    
+    def _load_model_mmap(self, device: str):
+        """
+        直接 mmap 加载 whisper 已下载的权重文件
+        
+        torch.load(mmap=True) 按需映射权重，不必先把整个 checkpoint 读入内存，不另存副本；
+        权重复制到模型自身的 fp32 参数中 (与 whisper.load_model 一致，fp16 由解码时决定)。
+        官方模型的 SHA256 校验与 whisper 相同，但通过后按文件大小与修改时间记录，之后不再重复计算。
+        文件尚未下载、校验不通过、格式不支持 mmap 或加载失败时返回 None，由调用方回退到 whisper.load_model
+        """
+        path = self._checkpoint_path()
+        if not path or not os.path.exists(path):
+            return None
+        if not self._verify_checkpoint(path):
+            return None
+        try:
+            from whisper.model import ModelDimensions, Whisper
+            
+            checkpoint = torch.load(path, map_location='cpu', mmap=True)
+            model = Whisper(ModelDimensions(**checkpoint['dims']))
+            model.load_state_dict(checkpoint['model_state_dict'])
+            del checkpoint
+            alignment_heads = getattr(whisper, '_ALIGNMENT_HEADS', {}).get(self.model_name)
+            if alignment_heads:
+                model.set_alignment_heads(alignment_heads)
+            return model.to(device)
+        except Exception as e:
+            print(f"⚠️ 模型快速加载失败，改用常规加载: {e}")
+            return None
+    
+    def _verify_checkpoint(self, path: str) -> bool:
+        """校验官方模型文件的 SHA256 (与 whisper 下载时的校验相同)，自定义模型不校验"""
+        if self.model_name not in whisper.available_models():
+            return True
+        # whisper 的下载链接中倒数第二段即为文件的 SHA256
+        expected = whisper._MODELS[self.model_name].split('/')[-2]
+        st = os.stat(path)
+        key = cache.make_key(path, st.st_size, st.st_mtime_ns, expected)
+        if cache.get_json('model-verified', key):
+            return True
+        
+        import hashlib
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+        if h.hexdigest() != expected:
+            print("⚠️ 模型文件校验失败，将重新下载")
+            return False
+        cache.put_json('model-verified', key, True)
+        return True
+    
+    @staticmethod
+    def _remove_legacy_model_copies():
+        """删除旧版本在处理缓存中另存的模型副本 (whisper-*.pt)"""
+        try:
+            with os.scandir(cache.CACHE_DIR) as it:
+                for entry in it:
+                    if entry.name.startswith('whisper-') and entry.name.endswith(('.pt', '.pt.tmp')):
+                        try:
+                            os.remove(entry.path)
+                        except OSError:
+                            pass
+        except OSError:
+            pass
+
     def transcribe(
         self,
         audio_path: str,
         language: Optional[str] = None,
-        progress_callback: Optional[Callable[[float, str], None]] = None
+        progress_callback: Optional[Callable[[float, str], None]] = None,
+        text_sink: Optional[Callable[[int, str], None]] = None
     ) -> dict:
         """
         转写音频文件
+        
+        相同音频内容 + 模型 + 语言的转写结果会缓存到本地，重复处理时直接返回
+        
+        Args:
+            text_sink: 文本回调 (序号, 文本)，按顺序调用；分片转写时每完成一段
+                       (且之前的段都已完成) 立即回调，其余情况在结束时回调一次全文
         """
         if not os.path.exists(audio_path):
             raise FileNotFoundError(f"音频文件不存在: {audio_path}")
         
+        cache_key = None
+        if cache.ENABLED:
+            cache_key = cache.make_key(cache.file_digest(audio_path), self.model_name, language, self._resolved_backend())
+            cached = cache.get_json('transcript', cache_key)
+            if cached:
+                print("✓ 命中转写缓存")
+                if progress_callback:
+                    progress_callback(99, "使用已缓存的转写结果")
+                if text_sink:
+                    text_sink(0, cached.get('text', ''))
+                return cached
+        
+        emitted = False
+        
+        def sink(index: int, text: str):
+            nonlocal emitted
+            emitted = True
+            text_sink(index, text)
+        
+        result = self._transcribe(audio_path, language, progress_callback, sink if text_sink else None)
+        if text_sink and not emitted:
+            text_sink(0, result.get('text', ''))
+        
+        if cache_key:
+            cache.put_json('transcript', cache_key, {
+                'text': result.get('text', ''),
+                'language': result.get('language'),
+                'segments': result.get('segments', [])
+            })
+        return result
+    
+    def _transcribe(
+        self,
+        audio_path: str,
+        language: Optional[str],
+        progress_callback: Optional[Callable[[float, str], None]],
+        text_sink: Optional[Callable[[int, str], None]] = None
+    ) -> dict:
+        """执行转写 (不经过缓存)"""
         # 确保模型已加载 (或客户端已初始化)
         self.load_model(progress_callback)
         
         if progress_callback:
             progress_callback(82, "开始语音转写...")
         
-        # --- API 转写路径 ---
         # --- API 转写路径 ---
         if self._is_api_model():
             # [Fix] 检查音频时长，如果超过 5 分钟强制使用切片模式
             # 防止 gpt-4o-mini 等模型在长音频下静默截断 (silent truncation)
             try:
-                from core.audio_processor import AudioProcessor
-                processor = AudioProcessor()
+                processor = self.audio_processor
                 duration = processor.get_audio_duration(audio_path)
                 
                 # [调整] 阈值设为 4分58秒 (298秒)
@@ -126,7 +669,7 @@ class Transcriber:
             if should_chunk:
                 if progress_callback:
                     progress_callback(83, f"正在进行分段转写 (总长 {duration:.1f}s)...")
-                return self._transcribe_chunked(audio_path, self.model_name, language, progress_callback)
+                return self._transcribe_chunked(audio_path, self.model_name, language, progress_callback, text_sink)
 
             try:
                 if progress_callback:
@@ -138,19 +681,22 @@ class Transcriber:
                 response_fmt = "json" if self.model_name.startswith("gpt-4o") else "verbose_json"
                 
                 # 检查文件大小，如果超过 24MB，进行压缩
-                # import os  <-- remove this
                 file_size_mb = os.path.getsize(audio_path) / (1024 * 1024)
                 if file_size_mb > 24:
                     if progress_callback:
                         progress_callback(83, f"音频文件过大 ({file_size_mb:.1f}MB)，正在压缩...")
                     
-                    from core.audio_processor import AudioProcessor
-                    processor = AudioProcessor()
+                    processor = self.audio_processor
+                    # 码率已经不高时重新编码也缩小不了多少，直接切片上传
+                    if not processor.needs_recompression(audio_path):
+                        print("⚠️ 音频码率已较低，改为切片上传...")
+                        return self._transcribe_chunked(audio_path, self.model_name, language, progress_callback, text_sink)
                     # 压缩生成新文件
                     try:
                         audio_path = processor.compress_for_api(audio_path, progress_callback=progress_callback)
                     except Exception as e:
-                        print(f"⚠️ 压缩失败: {e}，将尝试直接上传...")
+                        print(f"⚠️ 压缩失败: {e}，改为切片上传...")
+                        return self._transcribe_chunked(audio_path, self.model_name, language, progress_callback, text_sink)
 
                 with open(audio_path, "rb") as audio_file:
                     transcript = self.client.audio.transcriptions.create(
@@ -186,7 +732,7 @@ class Transcriber:
                 if "input_too_large" in error_str or "maximum context" in error_str:
                     print(f"⚠️ API 报错: 内容过长 ({error_str})")
                     print("🔄 触发自动切片转写模式 (Smart Chunking)...")
-                    return self._transcribe_chunked(audio_path, self.model_name, language, progress_callback)
+                    return self._transcribe_chunked(audio_path, self.model_name, language, progress_callback, text_sink)
 
                 # 策略 2: 其他错误，尝试回退到 whisper-1
                 if self.model_name != "whisper-1":
@@ -213,17 +759,23 @@ class Transcriber:
         # --- 本地 Whisper 转写路径 ---
         try:
             # 准备参数
-            # mps 上 fp16 可能会出现 NaN，如果遇到问题可以自动回退
-            # 默认尝试开启 fp16 (包括 MPS)
-            fp16 = True
+            # fp16 是否可用已在加载模型时探测 (包括 MPS)
+            fp16 = self._fp16
             
-            # 转写
-            result = self.model.transcribe(
-                audio_path,
-                language=language,
-                verbose=False, # 我们自己打印进度，不用自带的
-                fp16=fp16
-            )
+            # 转写: 默认使用 whisper 自带的滑动窗口 (带时间戳、温度回退与上文衔接)；
+            # 开启批量解码时长音频按 VAD 切成 ≤30s 片段批量解码
+            result = None
+            if self._backend == 'ct2':
+                result = self._transcribe_faster_whisper(audio_path, language, progress_callback)
+            elif self.batched_decode:
+                result = self._transcribe_local_batched(audio_path, language, progress_callback)
+            if result is None:
+                result = self.model.transcribe(
+                    audio_path,
+                    language=language,
+                    verbose=False, # 我们自己打印进度，不用自带的
+                    fp16=fp16
+                )
             
             if progress_callback:
                 print(f"  - 检测到的语言: {result.get('language', 'unknown')}")
@@ -233,8 +785,10 @@ class Transcriber:
             return result
             
         except RuntimeError as e:
+            # 探测未覆盖到的 NaN 情况兜底
             if "NaN" in str(e) and fp16:
                 print("⚠️ 检测到 NaN 错误，尝试禁用 fp16 重试...")
+                self._fp16 = False
                 return self.model.transcribe(
                     audio_path,
                     language=language,
@@ -246,12 +800,14 @@ class Transcriber:
             
     def unload_model(self):
         """手动释放模型内存"""
-        if self.model:
+        if self.model is not None:
+            # 同时移出进程内缓存，否则模型仍被引用无法释放
+            for key in [k for k, m in _MODEL_CACHE.items() if m is self.model]:
+                del _MODEL_CACHE[key]
             del self.model
             # 强制垃圾回收
             import gc
             gc.collect() 
-            import torch
             if torch.backends.mps.is_available():
                 torch.mps.empty_cache()
             elif torch.cuda.is_available():
@@ -260,118 +816,328 @@ class Transcriber:
 
     def format_segments(self, segments: list) -> str:
         """格式化分段信息为带时间戳的文本"""
-        lines = []
-        for seg in segments:
-            start = self._format_time(seg.get('start', 0))
-            end = self._format_time(seg.get('end', 0))
-            text = seg.get('text', '').strip()
-            lines.append(f"[{start} -> {end}] {text}")
-        return '\n'.join(lines)
+        try:
+            # whisper 输出的分段总是带有 start / end / text
+            return '\n'.join([
+                f"[{_TIME_FMT(divmod(int(seg['start']), 60))} -> "
+                f"{_TIME_FMT(divmod(int(seg['end']), 60))}] {seg['text'].strip()}"
+                for seg in segments
+            ])
+        except KeyError:
+            fmt = self._format_time
+            return '\n'.join([
+                f"[{fmt(seg.get('start', 0))} -> {fmt(seg.get('end', 0))}] {seg.get('text', '').strip()}"
+                for seg in segments
+            ])
     
     @staticmethod
     def _format_time(seconds: float) -> str:
         """格式化时间"""
-        minutes = int(seconds // 60)
-        secs = int(seconds % 60)
-        return f"{minutes:02d}:{secs:02d}"
+        return _TIME_FMT(divmod(int(seconds), 60))
+
+    @staticmethod
+    def _usage_tuple(usage) -> tuple:
+        """将 API 返回的 usage 对象整理为 (prompt, completion, total) token 数"""
+        if not usage:
+            return (0, 0, 0)
+        # 兼容不同字段名 (openai standard vs some compatible apis)
+        return (
+            getattr(usage, 'prompt_tokens', 0) or getattr(usage, 'input_tokens', 0) or 0,
+            getattr(usage, 'completion_tokens', 0) or getattr(usage, 'output_tokens', 0) or 0,
+            getattr(usage, 'total_tokens', 0) or 0,
+        )
+
+    async def _transcribe_part_async(
+        self,
+        client,
+        i: int,
+        total_chunks: int,
+        chunk_path: str,
+        model_name: str,
+        language: str
+    ) -> dict:
+        """
+        转写单个切片 (用于并发)
+        
+        遇到速率限制时按 Retry-After 退避并让所有片段共同冷却；
+        连接错误与服务端错误按指数退避重试 (客户端不再自带重试)
+        """
+        from openai import APIConnectionError, InternalServerError, RateLimitError
+        
+        # 空切片 (如切点恰好落在音频末尾) 无需上传，且无法 mmap
+        if os.path.getsize(chunk_path) == 0:
+            print(f"  √ [片段为空] {i+1}/{total_chunks}")
+            return {"index": i, "text": "", "usage": self._usage_tuple(None)}
+        
+        print(f"  -> [开始上传] 处理片段 {i+1}/{total_chunks}...")
+        for attempt in range(_RATE_LIMIT_RETRIES + 1):
+            # 其他片段触发限流后，等待共同的冷却时间结束
+            wait = self._rate_limit_until - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            try:
+                # 内存映射文件，由 httpx 分块读取上传，多个并发片段不会各自整体读入内存
+                with open(chunk_path, "rb") as fd, \
+                        mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    # 并行模式下无法使用上文 context prompt，因为上文还没出来
+                    response = await client.audio.transcriptions.create(
+                        model=model_name,
+                        file=(
+                            os.path.basename(chunk_path),
+                            mm,
+                            mimetypes.guess_type(chunk_path)[0] or 'application/octet-stream'
+                        ),
+                        language=language,
+                        response_format="json"
+                    )
+                    print(f"  √ [片段完成] {i+1}/{total_chunks}")
+                    return {
+                        "index": i,
+                        "text": response.text,
+                        "usage": self._usage_tuple(getattr(response, 'usage', None))
+                    }
+            except RateLimitError as e:
+                if attempt == _RATE_LIMIT_RETRIES:
+                    print(f"⚠️ [片段失败] {i+1}/{total_chunks}: {e}")
+                    raise e
+                try:
+                    delay = float(e.response.headers.get('retry-after', ''))
+                except ValueError:
+                    delay = 2 ** attempt
+                delay += random.uniform(0, 1)
+                self._rate_limit_until = max(self._rate_limit_until, time.monotonic() + delay)
+                print(f"⏳ [速率限制] 片段 {i+1}/{total_chunks} {delay:.1f}s 后重试 ({attempt + 1}/{_RATE_LIMIT_RETRIES})")
+            except (APIConnectionError, InternalServerError) as e:
+                if attempt == _RATE_LIMIT_RETRIES:
+                    print(f"⚠️ [片段失败] {i+1}/{total_chunks}: {e}")
+                    raise e
+                delay = 2 ** attempt + random.uniform(0, 1)
+                print(f"⏳ [请求失败] 片段 {i+1}/{total_chunks} {delay:.1f}s 后重试 ({attempt + 1}/{_RATE_LIMIT_RETRIES}): {e}")
+                await asyncio.sleep(delay)
+            except Exception as e:
+                print(f"⚠️ [片段失败] {i+1}/{total_chunks}: {e}")
+                raise e
 
-    def _transcribe_part(self, i: int, total_chunks: int, chunk_path: str, model_name: str, language: str) -> dict:
-        """转写单个切片 (用于并发)"""
-        print(f"  -> [线程启动] 处理片段 {i+1}/{total_chunks}...")
+    @staticmethod
+    def _vad_chunk_boundaries(audio_path: str, target: float = 298, search: float = 10) -> Optional[list]:
+        """
+        用 WebRTC VAD 寻找切片边界，避免在句子中间切断
+        
+        每个切点取目标位置之前 search 秒内 ([target - search, target]) 最靠后的静音段 (≥100ms) 中点，
+        保证每段不超过 target 秒；找不到静音时在目标位置硬切。未安装 webrtcvad 或解码失败时返回 None (按固定时长切片)
+        
+        Returns:
+            切点时间列表 (秒，升序)
+        """
         try:
-            with open(chunk_path, "rb") as audio_file:
-                # 并行模式下无法使用上文 context prompt，因为上文还没出来
-                response = self.client.audio.transcriptions.create(
-                    model=model_name,
-                    file=audio_file,
-                    language=language,
-                    response_format="json"
-                )
-                print(f"  √ [片段完成] {i+1}/{total_chunks}")
-                return {
-                    "index": i,
-                    "text": response.text,
-                    "usage": getattr(response, 'usage', None)
-                }
-        except Exception as e:
-            print(f"⚠️ [片段失败] {i+1}/{total_chunks}: {e}")
-            raise e
+            import webrtcvad
+        except ImportError:
+            return None
+        
+        sample_rate = 16000
+        frame_ms = 30
+        frame_bytes = sample_rate * frame_ms // 1000 * 2  # 16bit mono
+        min_silence_frames = -(-100 // frame_ms)  # 至少 100ms 连续静音
+        
+        vad = webrtcvad.Vad(2)
+        silences = []  # 静音段中点 (秒)
+        run = 0
+        frames = 0
+        
+        cmd = [
+            'ffmpeg', '-loglevel', 'error', '-nostats',
+            '-i', audio_path,
+            '-vn', '-f', 's16le', '-acodec', 'pcm_s16le',
+            '-ar', str(sample_rate), '-ac', '1',
+            'pipe:1'
+        ]
+        try:
+            with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=1 << 20) as proc:
+                while True:
+                    frame = proc.stdout.read(frame_bytes)
+                    if len(frame) < frame_bytes:
+                        break
+                    if vad.is_speech(frame, sample_rate):
+                        if run >= min_silence_frames:
+                            silences.append((frames - run / 2) * frame_ms / 1000)
+                        run = 0
+                    else:
+                        run += 1
+                    frames += 1
+            if proc.returncode != 0:
+                return None
+        except (OSError, ValueError) as e:
+            print(f"⚠️ VAD 分析失败，使用固定时长切片: {e}")
+            return None
+        
+        duration = frames * frame_ms / 1000
+        cut_points = []
+        last_cut = 0.0
+        i = 0
+        while last_cut + target < duration:
+            wanted = last_cut + target
+            # silences 有序，跳过窗口左侧的静音点
+            while i < len(silences) and silences[i] < wanted - search:
+                i += 1
+            # 只在目标位置之前找静音，片段不超过 target (API 单段时长限制)
+            j = i
+            while j < len(silences) and silences[j] <= wanted:
+                j += 1
+            last_cut = silences[j - 1] if j > i else wanted
+            i = j
+            cut_points.append(last_cut)
+        
+        print(f"🔇 VAD 切点: {len(cut_points)} 个 (音频时长 {duration:.1f}s)")
+        return cut_points
 
-    def _transcribe_chunked(self, audio_path: str, model_name: str, language: str, progress_callback: Optional[Callable] = None) -> dict:
+    async def _transcribe_chunks_async(
+        self,
+        chunk_iter,
+        total_chunks: int,
+        model_name: str,
+        language: str,
+        progress_callback: Optional[Callable] = None,
+        text_sink: Optional[Callable[[int, str], None]] = None
+    ) -> tuple:
         """
-        分片转写逻辑 (并行加速)
+        在单个事件循环中并发上传各片段
+        
+        切片生成器在线程池中推进，每切好一个片段立即创建上传任务，与后续片段的切分重叠；
+        并发数由信号量限制
+        
+        Returns:
+            ({序号: 文本}, usage 统计)
         """
-        from core.audio_processor import AudioProcessor
-        processor = AudioProcessor()
+        from openai import AsyncOpenAI
+        
+        client = AsyncOpenAI(
+            api_key=self.api_key,
+            base_url=self.base_url,
+            http_client=_make_async_http_client(self.concurrency),
+            max_retries=0  # 重试由 _transcribe_part_async 统一处理
+        )
+        semaphore = asyncio.Semaphore(self.concurrency)
+        loop = asyncio.get_running_loop()
+        # text_sink 可能阻塞 (如界面流水线的有界队列已满)，在单独的单线程中按顺序调用，
+        # 不占用事件循环，其余片段的上传不受下游速度影响
+        sink_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1) if text_sink else None
+        sink_futures = []
         
-        # 1. 切片 (每4分58秒一段 = 298秒)
+        results = {}
+        pending = []  # (序号, 文本) 小顶堆，等待按顺序输出
+        next_index = 0
+        completed_count = 0
+        total_usage = {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0}
+        
+        async def run(index: int, chunk_path: str):
+            nonlocal next_index, completed_count
+            try:
+                async with semaphore:
+                    data = await self._transcribe_part_async(
+                        client, index, total_chunks, chunk_path, model_name, language
+                    )
+            except Exception as e:
+                # 任何一个失败，直接终止整个流程
+                raise Exception(f"片段 {index+1} 转写失败，流程终止。错误: {str(e)}")
+            
+            results[index] = data['text']
+            
+            # 按顺序输出已连续到齐的片段
+            if text_sink:
+                heapq.heappush(pending, (index, data['text']))
+                while pending and pending[0][0] == next_index:
+                    sink_futures.append(loop.run_in_executor(
+                        sink_executor, text_sink, *heapq.heappop(pending)
+                    ))
+                    next_index += 1
+            
+            # 统计 usage (已整理为 (prompt, completion, total))
+            p_tokens, c_tokens, t_tokens = data['usage']
+            total_usage['prompt_tokens'] += p_tokens
+            total_usage['completion_tokens'] += c_tokens
+            total_usage['total_tokens'] += t_tokens
+            
+            completed_count += 1
+            if progress_callback:
+                progress = 85 + min(completed_count / total_chunks, 1) * 14
+                progress_callback(progress, f"并发转写中... ({completed_count}/{total_chunks})")
+        
+        tasks = []
+        try:
+            while True:
+                # 切片 (ffmpeg) 是阻塞操作，放到线程池中推进生成器
+                chunk_path = await loop.run_in_executor(None, next, chunk_iter, None)
+                if chunk_path is None:
+                    break
+                tasks.append(asyncio.create_task(run(len(tasks), chunk_path)))
+                # 已有片段失败时不再继续切分
+                for task in tasks:
+                    if task.done() and task.exception():
+                        await task
+            total_chunks = len(tasks)
+            await asyncio.gather(*tasks)
+            await asyncio.gather(*sink_futures)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        finally:
+            await client.close()
+            if sink_executor:
+                # 出错时不等待仍阻塞在下游的回调
+                sink_executor.shutdown(wait=False, cancel_futures=True)
+        
+        return results, total_usage
+
+    def _transcribe_chunked(
+        self,
+        audio_path: str,
+        model_name: str,
+        language: str,
+        progress_callback: Optional[Callable] = None,
+        text_sink: Optional[Callable[[int, str], None]] = None
+    ) -> dict:
+        """
+        分片转写逻辑 (AsyncOpenAI 并发上传)
+        
+        片段乱序完成，按序号用小顶堆缓冲，前面的段都到齐后立即按顺序交给 text_sink
+        """
+        processor = self.audio_processor
+        
+        # 1. 切片 (每4分58秒一段 = 298秒)，有 VAD 时切点对齐到附近的静音处
         chunk_duration = 298
         if progress_callback:
             progress_callback(84, f"正在进行智能切片 (每段 {chunk_duration}s)...")
         
-        chunks = processor.split_audio(audio_path, segment_seconds=chunk_duration)
-        total_chunks = len(chunks)
-        print(f"🔪 音频已切分为 {total_chunks} 个片段")
-        
-        results = [None] * total_chunks
-        total_usage = {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0}
+        cut_points = self._vad_chunk_boundaries(audio_path, target=chunk_duration)
+        # 切片与上传流水进行，片段总数先按时长预估
+        if cut_points is not None:
+            total_chunks = len(cut_points) + 1
+        else:
+            total_chunks = max(1, int(-(-processor.get_audio_duration(audio_path) // chunk_duration)))
+        print(f"🔪 音频预计切分为 {total_chunks} 个片段")
         
         # 2. 并发请求
-        # 限制并发数为 4，避免触发 API 速率限制 (429)
-        max_workers = 4
-        print(f"🚀 启动并发转写 (并发数: {max_workers})...")
+        print(f"🚀 启动并发转写 (并发数: {self.concurrency})...")
         
-        try:
-            with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-                # 提交所有任务
-                future_to_index = {
-                    executor.submit(
-                        self._transcribe_part, i, total_chunks, chunk_path, model_name, language
-                    ): i 
-                    for i, chunk_path in enumerate(chunks)
-                }
-                
-                completed_count = 0
-                for future in concurrent.futures.as_completed(future_to_index):
-                    index = future_to_index[future]
-                    try:
-                        # 获取结果，如果有异常会在这里抛出
-                        data = future.result()
-                        results[index] = data['text']
-                        
-                        # 统计 usage
-                        if data['usage']:
-                            u = data['usage']
-                            # 兼容不同字段名 (openai standard vs some compatible apis)
-                            p_tokens = getattr(u, 'prompt_tokens', 0) or getattr(u, 'input_tokens', 0)
-                            c_tokens = getattr(u, 'completion_tokens', 0) or getattr(u, 'output_tokens', 0)
-                            
-                            total_usage['prompt_tokens'] += p_tokens
-                            total_usage['completion_tokens'] += c_tokens
-                            total_usage['total_tokens'] += getattr(u, 'total_tokens', 0)
-                            
-                        completed_count += 1
-                        if progress_callback:
-                            progress = 85 + (completed_count / total_chunks) * 14
-                            progress_callback(progress, f"并发转写中... ({completed_count}/{total_chunks})")
-                            
-                    except Exception as e:
-                        # 任何一个失败，直接终止整个流程
-                        raise Exception(f"片段 {index+1} 转写失败，流程终止。错误: {str(e)}")
-
-        finally:
-            # 清理切片文件
-            for chunk_path in chunks:
-                if os.path.exists(chunk_path):
-                    try:
-                        os.remove(chunk_path)
-                    except:
-                        pass
+        # 切片写入临时目录，结束后整个目录一次删除
+        with tempfile.TemporaryDirectory(prefix='bili_chunks_') as chunk_dir:
+            chunk_iter = processor.iter_split_audio(
+                audio_path, segment_seconds=chunk_duration, output_dir=chunk_dir, cut_points=cut_points
+            )
+            try:
+                results, total_usage = asyncio.run(self._transcribe_chunks_async(
+                    chunk_iter, total_chunks, model_name, language, progress_callback, text_sink
+                ))
+            finally:
+                chunk_iter.close()
+        total_chunks = len(results)
         
         # 3. 拼合结果
-        # results 列表已经按照 index 位置填充好了
+        # 按片段序号顺序拼合
         # 用户要求段之间多加回车，使用 double newline 分隔
-        combined_text = "\n\n".join(results)
+        combined_text = "\n\n".join(results[i] for i in range(total_chunks))
         
         if progress_callback:
             progress_callback(99, "所有片段转写成功，已合并")
@@ -1,8 +1,17 @@
-import requests
-import json
-from typing import Dict, Optional
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from utils import cache, http
 from utils.helpers import validate_bilibili_url
 
+
+# 视频信息缓存有效期（秒）
+_INFO_CACHE_TTL = 24 * 3600
+# 进程内 LRU 缓存容量：界面预览与处理线程共享，同一视频不再读盘或请求网络
+_MEMO_SIZE = 64
+
+
 class VideoInfoFetcher:
     """
     Bilibili 视频信息获取器
@@ -10,35 +19,94 @@ class VideoInfoFetcher:
     """
     
     API_URL = "https://api.bilibili.com/x/web-interface/view"
-    USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36"
+    USER_AGENT = http.USER_AGENT
+    
+    _memo: "OrderedDict[str, tuple]" = OrderedDict()  # 视频 ID -> (获取时间, 信息)
+    _memo_lock = threading.Lock()
+
+    @classmethod
+    def _memo_get(cls, video_id: str) -> Optional[Dict]:
+        with cls._memo_lock:
+            entry = cls._memo.get(video_id)
+            if entry is None:
+                return None
+            if time.time() - entry[0] > _INFO_CACHE_TTL:
+                del cls._memo[video_id]
+                return None
+            cls._memo.move_to_end(video_id)
+            return entry[1]
+
+    @classmethod
+    def _memo_put(cls, video_id: str, info: Dict):
+        with cls._memo_lock:
+            cls._memo[video_id] = (time.time(), info)
+            cls._memo.move_to_end(video_id)
+            while len(cls._memo) > _MEMO_SIZE:
+                cls._memo.popitem(last=False)
+
+    @classmethod
+    def get_cached(cls, url_or_id: str) -> Optional[Dict]:
+        """只查内存与本地缓存，不发起网络请求；未命中返回 None"""
+        valid, video_id = validate_bilibili_url(url_or_id)
+        if not valid:
+            return None
+        return cls._get_cached(video_id)
 
     @classmethod
-    def get_info(cls, url_or_id: str) -> Optional[Dict]:
+    def _get_cached(cls, video_id: str) -> Optional[Dict]:
+        info = cls._memo_get(video_id)
+        if info:
+            return info
+        # BV 号区分大小写，文件名使用哈希键，避免在不区分大小写的文件系统上冲突
+        info = cache.get_json('videoinfo', cache.make_key(video_id), max_age=_INFO_CACHE_TTL)
+        if info:
+            cls._memo_put(video_id, info)
+        return info
+
+    @classmethod
+    def get_info(
+        cls,
+        url_or_id: str,
+        timeout: Tuple[float, float] = http.DEFAULT_TIMEOUT,
+        cancel: Optional[threading.Event] = None
+    ) -> Optional[Dict]:
         """
         通过 URL 或 ID 获取视频信息
+        
+        结果在本地缓存 24 小时，重复处理同一视频时不再请求 API；
+        同一进程内再次获取 (如预览后开始处理) 直接命中内存缓存
+        
+        Args:
+            timeout: (连接超时, 读取超时) 秒，保证调用方 (如预览线程) 最迟数秒内返回
+            cancel: 取消标记，请求返回后若已设置则放弃解析并返回 None
         """
         valid, video_id = validate_bilibili_url(url_or_id)
         if not valid:
             return None
+        
+        cached = cls._get_cached(video_id)
+        if cached:
+            return cached
             
         params = {}
         if video_id.lower().startswith('bv'):
             params['bvid'] = video_id
         else:
             params['aid'] = video_id.replace('av', '')
-            
-        headers = {
-            "User-Agent": cls.USER_AGENT,
-            "Referer": "https://www.bilibili.com"
-        }
+        
+        if cancel is not None and cancel.is_set():
+            return None
         
         try:
-            response = requests.get(cls.API_URL, params=params, headers=headers, timeout=10)
+            # 共享会话已带有 User-Agent / Referer 请求头
+            response = http.get(cls.API_URL, params=params, timeout=timeout)
+            if cancel is not None and cancel.is_set():
+                return None
             data = response.json()
             
             if data.get('code') == 0:
                 vdata = data.get('data', {})
-                return {
+                info = {
                     'title': vdata.get('title'),
                     'bvid': vdata.get('bvid'),
                     'aid': vdata.get('aid'),
@@ -49,6 +117,9 @@ class VideoInfoFetcher:
                     'duration': vdata.get('duration'),
                     'view': vdata.get('stat', {}).get('view')
                 }
+                cache.put_json('videoinfo', cache.make_key(video_id), info)
+                cls._memo_put(video_id, info)
+                return info
             else:
                 print(f"B站 API 返回错误: {data.get('message')}")
                 return None
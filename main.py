@@ -3,48 +3,6 @@ Bilibili 视频总结工具
 自动下载B站视频音频，使用Whisper转写，GPT生成结构化总结
 """
 
-# ============================================================
-# SSL 证书验证修复 (解决 macOS/Proxy 下模型下载失败问题)
-# ============================================================
-import ssl
-try:
-    _create_unverified_https_context = ssl._create_unverified_context
-except AttributeError:
-    pass
-else:
-    ssl._create_default_https_context = _create_unverified_https_context
-
-# ============================================================
-# PyTorch 2.6+ 兼容性补丁 (必须在所有其他导入之前!)
-# 解决 Whisper 模型加载时 weights_only=True 导致的错误
-# ============================================================
-def _apply_pytorch_patch():
-    try:
-        import torch
-        import torch.serialization
-        
-        # 保存原始函数
-        _original_torch_load = torch.load
-        
-        # 创建兼容版本
-        def _patched_load(*args, **kwargs):
-            # 强制设置 weights_only=False
-            kwargs['weights_only'] = False
-            return _original_torch_load(*args, **kwargs)
-        
-        # 替换 torch.load
-        torch.load = _patched_load
-        
-        # 同时替换 torch.serialization.load (某些库直接使用这个)
-        if hasattr(torch.serialization, 'load'):
-            torch.serialization.load = _patched_load
-            
-    except ImportError:
-        pass  # torch 还没安装，稍后会自动安装
-
-_apply_pytorch_patch()
-# ============================================================
-
 import sys
 import os
 import shutil
@@ -64,31 +22,34 @@ def check_and_install_dependencies():
         'requests': 'requests>=2.31.0',
     }
     
-    missing_packages = []
-    
-    for import_name, install_name in required_packages.items():
-        try:
-            __import__(import_name)
-        except ImportError:
-            missing_packages.append(install_name)
+    # 每次启动都检查：只查找模块是否存在，不执行模块代码 (whisper 会连带导入 torch，耗时数秒)，
+    # 开销仅为几次目录查找，卸载某个依赖后也能及时发现
+    import importlib.util
+    missing_packages = [
+        install_name
+        for import_name, install_name in required_packages.items()
+        if importlib.util.find_spec(import_name) is None
+    ]
     
     if missing_packages:
         print("=" * 50)
         print("检测到缺失的依赖包，正在自动安装...")
         print("=" * 50)
         
-        for package in missing_packages:
-            print(f"\n正在安装: {package}")
-            try:
-                subprocess.check_call([
-                    sys.executable, '-m', 'pip', 'install', 
-                    package, '--quiet'
-                ])
-                print(f"  ✓ {package} 安装成功")
-            except subprocess.CalledProcessError as e:
-                print(f"  ✗ {package} 安装失败: {e}")
-                print(f"\n请手动运行: pip install {package}")
-                sys.exit(1)
+        # 一次 pip 调用安装全部缺失的包，只运行一次依赖解析
+        print(f"\n正在安装: {' '.join(missing_packages)}")
+        env = dict(os.environ, PIP_DISABLE_PIP_VERSION_CHECK='1', PIP_NO_PYTHON_VERSION_WARNING='1')
+        try:
+            subprocess.check_call([
+                sys.executable, '-m', 'pip', 'install',
+                *missing_packages, '--quiet',
+                '--disable-pip-version-check', '--no-input'
+            ], env=env)
+            print("  ✓ 安装成功")
+        except subprocess.CalledProcessError as e:
+            print(f"  ✗ 安装失败: {e}")
+            print(f"\n请手动运行: pip install {' '.join(missing_packages)}")
+            sys.exit(1)
         
         print("\n" + "=" * 50)
         print("所有依赖安装完成！正在启动程序...")
@@ -96,19 +57,45 @@ def check_and_install_dependencies():
 
 
 def check_ffmpeg():
-    """检查FFmpeg是否已安装"""
+    """检查FFmpeg是否已安装 (只在 PATH 中查找，不启动 ffmpeg 进程)"""
+    return shutil.which('ffmpeg') is not None
+
+
+def print_torch_info():
+    """显示 PyTorch 版本与可用的加速设备"""
     try:
-        subprocess.run(
-            ['ffmpeg', '-version'], 
-            capture_output=True, 
-            check=True
-        )
-        return True
-    except (subprocess.CalledProcessError, FileNotFoundError):
-        return False
+        import torch
+        print(f"PyTorch 版本: {torch.__version__}")
+        
+        if torch.backends.mps.is_available():
+            print("✓ Apple Silicon GPU (MPS) 可用")
+        elif torch.cuda.is_available():
+            print(f"✓ CUDA GPU 可用: {torch.cuda.get_device_name(0)}")
+        else:
+            print("⚠️  仅 CPU 模式")
+    except:
+        pass
+
+
+def print_history():
+    """列出最近处理过的视频 (新的在前)"""
+    from utils.config import Config
+    
+    history = Config().get_history()
+    if not history:
+        print("暂无历史记录")
+        return
+    for item in history:
+        print(f"{item.get('timestamp', '')[:16]}  {item.get('title', '')}")
+        print(f"    {item.get('url', '')}  ->  {item.get('md_path', '')}")
 
 
 def main(args, parser=None):
+    # 只查看历史记录时无需检查依赖
+    if args.history:
+        print_history()
+        return
+    
     # 首先检查并安装依赖
     check_and_install_dependencies()
     
@@ -132,18 +119,9 @@ def main(args, parser=None):
     print("=" * 60)
     print(f"Python 版本: {sys.version.split()[0]}")
     
-    try:
-        import torch
-        print(f"PyTorch 版本: {torch.__version__}")
-        
-        if torch.backends.mps.is_available():
-            print("✓ Apple Silicon GPU (MPS) 可用")
-        elif torch.cuda.is_available():
-            print(f"✓ CUDA GPU 可用: {torch.cuda.get_device_name(0)}")
-        else:
-            print("⚠️  仅 CPU 模式")
-    except:
-        pass
+    # PyTorch 导入耗时数秒，命令行模式下只在使用本地模型时才显示 (见 run_cli)
+    if args.ui or not args.url:
+        print_torch_info()
     
     print("=" * 60 + "\n")
     
@@ -172,11 +150,11 @@ def main(args, parser=None):
         
         window = MainWindow()
         
-        # 如果命令行指定了URL，自动填入
+        # 如果命令行指定了URL，自动填入 (界面一次只处理一个视频)
         if args.url:
-            window.url_input.setText(args.url)
+            window.url_input.setText(args.url[0])
             # 触发一下预览
-            window.on_url_changed(args.url)
+            window.on_url_changed(args.url[0])
             
         window.show()
         
@@ -189,44 +167,72 @@ def main(args, parser=None):
         print("用法错误: 请提供视频 URL 或使用 --ui 启动图形界面")
     
     print("\n提示:")
-    print("  - 命令行运行: python main.py <URL>")
+    print("  - 命令行运行: python main.py <URL> [<URL> ...]")
     print("  - 启动界面:   python main.py --ui")
     sys.exit(0)
 
 
-def run_cli(url: str, args):
-    """命令行运行模式"""
+# 命令行批量处理时，最多提前下载的视频数 (含当前正在处理的视频)
+_DOWNLOAD_AHEAD = 2
+
+
+def run_cli(urls, args):
+    """
+    命令行运行模式
+    
+    支持一次处理多个视频，各阶段以流水线方式重叠执行:
+      - 元数据获取提前全部提交到线程池；下载 (网络 I/O) 以滑动窗口提前进行，最多领先 _DOWNLOAD_AHEAD 个视频
+      - 音频处理与转写在主线程依次进行
+      - 总结与保存 (API 等待) 在独立线程中进行，与下一个视频的转写重叠
+    """
     import tempfile
+    import concurrent.futures
     from utils.config import Config
     from core.video_info import VideoInfoFetcher
     from core.downloader import VideoDownloader
     from core.audio_processor import AudioProcessor
     from core.transcriber import Transcriber
     from core.summarizer import Summarizer
-    from utils.helpers import safe_filename, ensure_dir
+    from utils.helpers import ensure_dir, validate_bilibili_urls
+
+    if isinstance(urls, str):
+        urls = [urls]
 
     print("📺 命令行模式启动...")
-    print(f"🎯 目标视频: {url}")
+    # 批量验证链接，无效的直接跳过，不占用下载与转写资源
+    valid_urls = []
+    video_ids = []  # 与 valid_urls 对应的规范化视频ID
+    for i, ok, info in validate_bilibili_urls(urls):
+        if ok:
+            valid_urls.append(urls[i])
+            video_ids.append(info)
+            print(f"🎯 目标视频: {urls[i]}")
+        else:
+            print(f"❌ 跳过无效链接 ({urls[i]}): {info}")
+    if not valid_urls:
+        sys.exit(1)
+    urls = valid_urls
     
     # 1. 加载与更新配置
     config = Config()
     
-    # 如果命令行提供了参数，更新配置文件
-    if args.api_key:
-        print(f"⚙️  更新配置: API Key -> {args.api_key[:8]}***")
-        config.set_api_key(args.api_key)
+    # 如果命令行提供了参数，更新配置文件 (多项改动合并为一次写入)
+    with config.batch():
+        if args.api_key:
+            print(f"⚙️  更新配置: API Key -> {args.api_key[:8]}***")
+            config.set_api_key(args.api_key)
     
-    if args.whisper_model:
-        print(f"⚙️  更新配置: Whisper模型 -> {args.whisper_model}")
-        config.set_whisper_model(args.whisper_model)
+        if args.whisper_model:
+            print(f"⚙️  更新配置: Whisper模型 -> {args.whisper_model}")
+            config.set_whisper_model(args.whisper_model)
         
-    if args.gpt_model:
-        print(f"⚙️  更新配置: GPT模型 -> {args.gpt_model}")
-        config.set_gpt_model(args.gpt_model)
+        if args.gpt_model:
+            print(f"⚙️  更新配置: GPT模型 -> {args.gpt_model}")
+            config.set_gpt_model(args.gpt_model)
         
-    if args.output_dir:
-        print(f"⚙️  更新配置: 输出目录 -> {args.output_dir}")
-        config.set_output_dir(args.output_dir)
+        if args.output_dir:
+            print(f"⚙️  更新配置: 输出目录 -> {args.output_dir}")
+            config.set_output_dir(args.output_dir)
     
     # 获取最终使用的配置
     api_key = config.get_api_key()
@@ -246,6 +252,10 @@ def run_cli(url: str, args):
     gpt_model = config.get_gpt_model()
     output_dir = config.get_output_dir()
     
+    # 本地模型才需要 PyTorch
+    if whisper_model not in ('gpt-4o-transcribe', 'gpt-4o-mini-transcribe', 'whisper-1'):
+        print_torch_info()
+    
     # CPU 模式 (环境变量设置，不持久化到 Config，除非 Config 有对应字段，目前 Config 似乎没有 cpu 字段)
     if args.cpu:
         os.environ['FORCE_CPU'] = '1'
@@ -255,98 +265,128 @@ def run_cli(url: str, args):
     print(f"📂 输出目录: {output_dir}")
     print(f"🤖 模型设置: Whisper={whisper_model}, GPT={gpt_model}")
     
+    failed = 0
     try:
         # 创建临时目录
-        with tempfile.TemporaryDirectory() as temp_dir:
-            # 1. 获取信息 (优先元数据标题)
-            print("\n============ 1. 获取视频信息 ============")
-            video_meta = VideoInfoFetcher.get_info(url)
-            meta_title = ""
-            if video_meta:
-                meta_title = video_meta.get('title', '')
-                print(f"✓ 标题: {meta_title}")
-                print(f"✓ UP主: {video_meta.get('owner', 'Unknown')}")
-            else:
-                print("⚠️ 无法获取元数据，将尝试直接下载")
-
-            # 2. 下载视频
-            print("\n============ 2. 下载视频 ============")
-            downloader = VideoDownloader(temp_dir)
-            
-            # 下载视频
-            download_result = downloader.download_video(url, progress_callback=lambda p, s: print(f"  -> {s}") if p % 20 == 0 else None)
-            
-            if not download_result:
-                print("❌ 下载失败")
-                sys.exit(1)
-            
-            # 确定最终标题: 优先使用元数据标题，其次是下载器获取的标题
-            final_title = meta_title or download_result.get('title', 'Unknown')
-            # 再次清理标题，确保安全
-            safe_title = safe_filename(final_title)
-            
-            video_path = download_result['video_path']
-            print(f"✓ 下载完成 (标题锁定: {final_title})")
-            
-            # 3. 处理音频
-            print("\n============ 3. 提取与处理音频 ============")
-            processor = AudioProcessor()
-            processed_audio = processor.process_audio(video_path, progress_callback=lambda p, s: None)
-            print(f"✓ 音频准备就绪")
+        with tempfile.TemporaryDirectory() as temp_dir, \
+                concurrent.futures.ThreadPoolExecutor(max_workers=4) as io_pool, \
+                concurrent.futures.ThreadPoolExecutor(max_workers=1) as summary_pool:
+            # 1. 元数据请求很小，全部提前提交
+            meta_futures = [io_pool.submit(VideoInfoFetcher.get_info, url) for url in urls]
             
-            # 4. 转写
-            print("\n============ 4. 语音转写 ============")
-            transcriber = Transcriber(whisper_model, api_key=api_key)
+            # 2. 下载使用滑动窗口：最多提前 _DOWNLOAD_AHEAD 个视频，
+            #    处理一个视频时才提交后面的下载，长列表不会先把所有视频下载到磁盘
+            download_futures = {}
             
-            def transcribe_progress(p, s):
-                if p > 90 or p % 20 == 0: print(f"  -> {s}")
-                
-            transcribe_result = transcriber.transcribe(processed_audio, progress_callback=transcribe_progress)
-            transcript_text = transcribe_result['text']
+            def submit_download(i: int):
+                if i >= len(urls) or i in download_futures:
+                    return
+                tag = f"[{i + 1}/{len(urls)}]"  # 并发下载的进度行带上视频序号，便于区分
+                downloader = VideoDownloader(os.path.join(temp_dir, str(i)))
+                download_futures[i] = io_pool.submit(
+                    downloader.download_video,
+                    urls[i],
+                    progress_callback=lambda p, s: print(f"  -> {tag} {s}") if p % 20 == 0 else None
+                )
             
-            if 'usage' in transcribe_result:
-                usage = transcribe_result['usage']
-                if hasattr(usage, 'total_tokens'): # Object
-                     print(f"💰 转写 Token: {usage.total_tokens}")
-                else: # Dict
-                     print(f"💰 转写 Token: {usage}")
-                     
-            print(f"✓ 转写完成 (长度: {len(transcript_text)} 字符)")
+            for i in range(_DOWNLOAD_AHEAD):
+                submit_download(i)
             
-            # 5. 总结
-            print("\n============ 5. 生成总结 ============")
-            summarizer = Summarizer(api_key)
-            summary_result = summarizer.generate_summary(
-                transcript_text, 
-                video_title=final_title,
-                model=gpt_model
+            # 转写器与音频处理器在多个视频间复用 (本地模型只加载一次)
+            processor = AudioProcessor(trim_silence=args.trim_silence)
+            transcriber = Transcriber(
+                whisper_model,
+                api_key=api_key,
+                backend=args.backend,
+                concurrency=args.concurrency,
+                batched_decode=args.batched_decode
             )
-            print("✓ 总结生成完成")
-            
-            # 6. 保存文件 (单文件模式)
-            print("\n============ 6. 保存文件 ============")
-            
-            md_filename = f"{safe_title}.md"
-            md_filepath = os.path.join(output_dir, md_filename)
-            
-            # 避免覆盖
-            if os.path.exists(md_filepath):
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M")
-                md_filename = f"{safe_title}_{timestamp}.md"
-                md_filepath = os.path.join(output_dir, md_filename)
+            summarizer = Summarizer(api_key)
+            save_futures = []
             
-            content = f"# {final_title}\n\n"
-            content += f"**URL**: {url}\n"
-            content += f"**日期**: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
-            content += f"## 💡 核心总结\n\n{summary_result.get('summary', '')}\n\n"
-            content += f"## 📑 详细大纲\n\n{summary_result.get('outline', '')}\n\n"
-            content += f"## 💎 价值内容\n\n{summary_result.get('value_content', '')}\n\n"
-            content += f"---\n\n## 📝 语音转写原文\n\n{transcript_text}"
+            for i, url in enumerate(urls):
+                print(f"\n######## 视频 {i + 1}/{len(urls)}: {url} ########")
+                submit_download(i)
+                submit_download(i + _DOWNLOAD_AHEAD - 1)
+                try:
+                    # 1. 获取信息 (优先元数据标题)
+                    print("\n============ 1. 获取视频信息 ============")
+                    video_meta = meta_futures[i].result()
+                    meta_title = ""
+                    if video_meta:
+                        meta_title = video_meta.get('title', '')
+                        print(f"✓ 标题: {meta_title}")
+                        print(f"✓ UP主: {video_meta.get('owner', 'Unknown')}")
+                    else:
+                        print("⚠️ 无法获取元数据，将尝试直接下载")
+
+                    # 2. 下载视频
+                    print("\n============ 2. 下载视频 ============")
+                    download_result = download_futures.pop(i).result()
+                    
+                    if not download_result:
+                        raise Exception("下载失败")
+                    
+                    # 确定最终标题: 优先使用元数据标题，其次是下载器获取的标题
+                    final_title = meta_title or download_result.get('title', 'Unknown')
+                    
+                    video_path = download_result['video_path']
+                    print(f"✓ 下载完成 (标题锁定: {final_title})")
+                    
+                    # 3. 处理音频
+                    print("\n============ 3. 提取与处理音频 ============")
+                    processed_audio = processor.process_audio(
+                        video_path,
+                        progress_callback=lambda p, s: None,
+                        duration=download_result.get('duration')
+                    )
+                    print(f"✓ 音频准备就绪")
+                    
+                    # 4. 转写
+                    print("\n============ 4. 语音转写 ============")
+                    
+                    def transcribe_progress(p, s):
+                        if p > 90 or p % 20 == 0: print(f"  -> {s}")
+                        
+                    transcribe_result = transcriber.transcribe(processed_audio, progress_callback=transcribe_progress)
+                    transcript_text = transcribe_result['text']
+                    
+                    if 'usage' in transcribe_result:
+                        usage = transcribe_result['usage']
+                        if hasattr(usage, 'total_tokens'): # Object
+                             print(f"💰 转写 Token: {usage.total_tokens}")
+                        else: # Dict
+                             print(f"💰 转写 Token: {usage}")
+                             
+                    print(f"✓ 转写完成 (长度: {len(transcript_text)} 字符)")
+                    
+                    # 下载与处理后的音频已不再需要，立即删除，不等到全部视频处理完
+                    shutil.rmtree(os.path.join(temp_dir, str(i)), ignore_errors=True)
+                    
+                    # 5 & 6. 总结与保存交给后台线程，主线程继续转写下一个视频
+                    save_futures.append((url, video_ids[i], final_title, summary_pool.submit(
+                        _summarize_and_save,
+                        summarizer, url, final_title, transcript_text, gpt_model, output_dir,
+                        f"[{i + 1}/{len(urls)}] "
+                    )))
+                    
+                except Exception as e:
+                    failed += 1
+                    print(f"\n❌ 发生错误: {str(e)}")
             
-            with open(md_filepath, 'w', encoding='utf-8') as f:
-                f.write(content)
-                
-            print(f"✅ 总结已保存: {md_filepath}")
+            for url, video_id, final_title, future in save_futures:
+                try:
+                    md_filepath = future.result()
+                    config.add_to_history({
+                        'title': final_title,
+                        'url': url,
+                        'bvid': video_id,
+                        'md_path': md_filepath,
+                        'timestamp': datetime.now().isoformat()
+                    })
+                except Exception as e:
+                    failed += 1
+                    print(f"\n❌ 发生错误 ({url}): {str(e)}")
             # 临时目录也就是 temp_dir 退出后会自动清理视频和音频，无需手动 move 或 remove
 
     except Exception as e:
@@ -354,6 +394,58 @@ def run_cli(url: str, args):
         # import traceback
         # traceback.print_exc()
         sys.exit(1)
+    
+    if failed:
+        print(f"\n⚠️ 共 {len(urls)} 个视频，{failed} 个处理失败")
+        sys.exit(1)
+
+
+def _summarize_and_save(summarizer, url: str, final_title: str, transcript_text: str, gpt_model: str, output_dir: str, tag: str = ""):
+    """
+    生成总结并保存为 Markdown 文件 (命令行模式的最后两个阶段)
+    
+    在后台线程中与下一个视频的转写同时进行，输出行以 tag (视频序号) 开头以便区分
+    """
+    from utils.helpers import safe_filename, output_name_candidates, create_temp_file, publish_new_file
+
+    # 5. 总结
+    print(f"\n============ {tag}5. 生成总结 ============")
+    summary_result = summarizer.generate_summary(
+        transcript_text, 
+        video_title=final_title,
+        model=gpt_model
+    )
+    print(f"✓ {tag}总结生成完成")
+    
+    # 6. 保存文件 (单文件模式)
+    print(f"\n============ {tag}6. 保存文件 ============")
+    
+    # 再次清理标题，确保安全
+    safe_title = safe_filename(final_title)
+    
+    content = f"# {final_title}\n\n"
+    content += f"**URL**: {url}\n"
+    content += f"**日期**: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
+    content += f"## 💡 核心总结\n\n{summary_result.get('summary', '')}\n\n"
+    content += f"## 📑 详细大纲\n\n{summary_result.get('outline', '')}\n\n"
+    content += f"## 💎 价值内容\n\n{summary_result.get('value_content', '')}\n\n"
+    content += f"---\n\n## 📝 语音转写原文\n\n{transcript_text}"
+    
+    # 先写临时文件，再发布为第一个不存在的文件名 (已存在时改用带时间戳的文件名，不覆盖)
+    fd, tmp_path = create_temp_file(output_dir, '.md.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(content)
+        md_filepath = publish_new_file(tmp_path, output_name_candidates(output_dir, safe_title))
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    
+    print(f"✅ {tag}总结已保存: {md_filepath}")
+    return md_filepath
 
 
 if __name__ == '__main__':
@@ -361,13 +453,22 @@ if __name__ == '__main__':
     from datetime import datetime
     
     parser = argparse.ArgumentParser(description="Bilibili 视频总结工具")
-    parser.add_argument('url', nargs='?', help='视频链接或BV号')
+    parser.add_argument('url', nargs='*', help='视频链接或BV号 (可同时提供多个)')
     parser.add_argument('--ui', action='store_true', help='强制启动图形界面')
+    parser.add_argument('--history', action='store_true', help='列出最近处理过的视频')
     parser.add_argument('--api-key', help='OpenAI API Key (覆盖配置)')
     parser.add_argument('--whisper-model', help='Whisper 模型 (覆盖配置)')
     parser.add_argument('--gpt-model', help='GPT 模型 (覆盖配置)')
     parser.add_argument('--output-dir', help='输出目录 (默认 ~/Downloads)')
     parser.add_argument('--cpu', action='store_true', help='强制使用 CPU')
+    parser.add_argument('--trim-silence', action='store_true',
+                        help='去除音频中的静音段以缩短转写时长 (转写时间戳将与视频不对应)')
+    parser.add_argument('--backend', choices=['whisper', 'faster-whisper'],
+                        help='本地转写后端 (默认: --cpu 模式下已安装 faster-whisper 时自动使用，否则为 whisper)')
+    parser.add_argument('--batched-decode', action='store_true',
+                        help='本地 whisper 按静音切段批量解码 (GPU 上更快，但无逐句时间戳，质量可能略低)')
+    parser.add_argument('--concurrency', type=int,
+                        help='在线分片转写的并发数 (默认 8，或环境变量 BILI_TRANSCRIBE_CONCURRENCY)')
     
     args = parser.parse_args()
     
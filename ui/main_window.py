@@ -3,29 +3,56 @@
 Bilibili视频总结工具的主界面
 """
 import os
+import sys
+import glob
+import json
+import subprocess
 import tempfile
 import shutil
+import threading
+import time
+import concurrent.futures
+from collections import deque
 from datetime import datetime
-from typing import Optional
+from typing import Callable, Optional
 
 from PyQt6.QtWidgets import (
     QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QGridLayout,
     QGroupBox, QLabel, QLineEdit, QPushButton, QComboBox, QCheckBox,
-    QProgressBar, QTextEdit, QTabWidget, QFileDialog,
-    QMessageBox, QStatusBar, QFrame, QSplitter
+    QProgressBar, QTextEdit, QPlainTextEdit, QTabWidget, QFileDialog,
+    QMessageBox, QStatusBar, QFrame, QSplitter, QInputDialog
 )
-from PyQt6.QtCore import Qt, QThread, pyqtSignal
-from PyQt6.QtGui import QFont
+from PyQt6.QtCore import Qt, QRunnable, QThread, QThreadPool, QTimer, pyqtSignal
+from PyQt6.QtGui import QFont, QTextCursor
 
+from utils import cache
 from utils.config import Config
-from utils.helpers import validate_bilibili_url, format_duration, safe_filename
-from core.downloader import VideoDownloader
-from core.audio_processor import AudioProcessor
-from core.transcriber import Transcriber
-from core.summarizer import Summarizer
+from utils.helpers import parse_bilibili_url, validate_bilibili_url, format_duration, safe_filename, output_name_candidates, create_temp_file, publish_new_file
+# 下载 / 音频 / 转写 / 总结模块依赖 yt_dlp、openai 等重量级库，在处理线程各阶段中按需导入
 from core.video_info import VideoInfoFetcher
 
 
+# 总结失败或被取消时保留的转写检查点 (可从总结步骤恢复)
+RESUME_DIR = os.path.join(cache.CACHE_DIR, 'resume')
+_TEMP_PREFIX = "bili_summary_"
+_CHECKPOINT_NAME = "transcript.json"
+
+
+class _RemoveTreeTask(QRunnable):
+    """在全局线程池中删除目录"""
+    
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+    
+    def run(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+class TaskCancelled(Exception):
+    """任务被用户取消 (如关闭窗口)"""
+
+
 class VideoInfoThread(QThread):
     """异步获取视频信息的线程"""
     info_received = pyqtSignal(dict)
@@ -34,169 +61,461 @@ class VideoInfoThread(QThread):
     def __init__(self, url: str):
         super().__init__()
         self.url = url
+        self._cancel = threading.Event()
+    
+    def cancel(self):
+        """取消获取：已发出的请求不再解析，结果也不再发送"""
+        self._cancel.set()
+        self.requestInterruption()
         
     def run(self):
         try:
-            info = VideoInfoFetcher.get_info(self.url)
+            info = VideoInfoFetcher.get_info(self.url, cancel=self._cancel)
+            if self._cancel.is_set():
+                return
             if info:
                 self.info_received.emit(info)
             else:
                 self.error.emit("无法获取视频信息")
+        except Exception as e:
+            if not self._cancel.is_set():
+                self.error.emit(str(e))
+
+
+class CacheScanThread(QThread):
+    """在后台统计 Whisper 模型缓存与本地处理缓存的占用，避免大缓存目录阻塞界面"""
+    scan_done = pyqtSignal(object, list)  # 总字节数 (可能超过 int32), 找到的目录
+    error = pyqtSignal(str)
+    
+    # faster-whisper 使用 HuggingFace cache (~/.cache/huggingface/hub)
+    HF_CACHE_DIR = os.path.expanduser("~/.cache/huggingface/hub")
+    # 同时也检查旧的 whisper 缓存
+    OLD_CACHE_DIR = os.path.expanduser("~/.cache/whisper")
+    
+    def run(self):
+        try:
+            total_size = 0
+            found_dirs = []
+            
+            # 扫描 HuggingFace 缓存 (只扫描 whisper 相关的)
+            if os.path.isdir(self.HF_CACHE_DIR):
+                with os.scandir(self.HF_CACHE_DIR) as it:
+                    for entry in it:
+                        if "whisper" in entry.name.lower():
+                            total_size += self._dir_size(entry.path)
+                            found_dirs.append(entry.path)
+
+            # 扫描旧缓存
+            if os.path.isdir(self.OLD_CACHE_DIR):
+                size = self._dir_size(self.OLD_CACHE_DIR)
+                if size:
+                    total_size += size
+                    found_dirs.append(self.OLD_CACHE_DIR)
+            
+            # 扫描本程序的处理缓存 (下载、音频、转写、总结；不含恢复检查点)
+            for path in cache.cache_paths():
+                total_size += self._dir_size(path) if os.path.isdir(path) else os.path.getsize(path)
+                found_dirs.append(path)
+            
+            self.scan_done.emit(total_size, found_dirs)
         except Exception as e:
             self.error.emit(str(e))
+    
+    @staticmethod
+    def _dir_size(path: str) -> int:
+        """
+        统计目录下文件总大小：用栈代替 os.walk，scandir 的 stat 结果直接复用；
+        不跟随符号链接 (HF 缓存的 snapshots 是指向 blobs 的链接，跟随会重复计数)
+        """
+        total = 0
+        stack = [path]
+        while stack:
+            try:
+                with os.scandir(stack.pop()) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            total += entry.stat(follow_symlinks=False).st_size
+            except OSError:
+                pass
+        return total
 
 
 class ProcessThread(QThread):
-    """后台处理线程"""
+    """
+    后台处理线程
+    
+    一次只处理一个视频，下载 → 音频处理 → 转写 → 总结 四个阶段在本线程中依次执行；
+    各阶段内部的并行 (元数据与下载、分片转写) 由相应组件自行处理
+    """
     progress = pyqtSignal(float, str)  # 进度百分比, 状态文本
     finished = pyqtSignal(dict)  # 处理结果
     error = pyqtSignal(str)  # 错误信息
+    log = pyqtSignal(str)  # 日志行，由主窗口缓冲后批量显示
+    
+    # 阶段: (组件自身上报的进度区间, 映射到的总进度区间)，按各阶段的大致耗时分配
+    _STAGE_PROGRESS = {
+        'download': ((0, 55), (2, 45)),
+        'audio': ((55, 75), (45, 55)),
+        'transcribe': ((75, 99), (55, 90)),
+        'summarize': ((92, 98), (90, 98)),
+    }
+    _PROGRESS_INTERVAL = 0.03  # 同一整数百分比内，两次进度信号的最小间隔（秒）
     
-    def __init__(self, url: str, api_key: str, model: str, custom_model_path: str = "", gpt_model: str = "gpt-4o-mini", output_dir: str = ""):
+    def __init__(self, url: str, api_key: str, model: str, custom_model_path: str = "", gpt_model: str = "gpt-4o-mini", output_dir: str = "", home: str = "", preloaded_meta: Optional[dict] = None, resume_from: Optional[str] = None, trim_silence: bool = False):
         super().__init__()
         self.url = url
         self.api_key = api_key
         self.model = model
         self.custom_model_path = custom_model_path
         self.gpt_model = gpt_model
-        self.output_dir = output_dir or os.path.join(os.path.expanduser('~'), 'Downloads')
-        self.temp_dir = tempfile.mkdtemp(prefix="bili_summary_")
+        self.output_dir = output_dir or os.path.join(home or os.path.expanduser('~'), 'Downloads')
+        self.preloaded_meta = preloaded_meta  # 预览阶段已获取的元数据，有则跳过重复请求
+        self.resume_from = resume_from  # 转写检查点路径，有则直接从总结步骤开始
+        self.trim_silence = trim_silence  # 音频处理时是否去除静音段
+        self.temp_dir: Optional[str] = None  # 在 run() 中创建，线程未启动时不留下空目录
+        self._percent = 0.0
+        self._last_emit = (-1, 0.0)  # 上次发送的 (整数百分比, 时间)
+        self._progress_lock = threading.Lock()
+        self._cancel = threading.Event()
+    
+    def request_cancel(self):
+        """
+        请求协作式取消：各阶段开始时与每次进度回调时检查，
+        下载、转写等长任务借进度回调抛出 TaskCancelled 提前退出；
+        音频处理器持有同一取消事件，直接结束正在运行的 ffmpeg 子进程，临时目录照常清理
+        """
+        self._cancel.set()
+    
+    def _check_cancel(self):
+        if self._cancel.is_set():
+            raise TaskCancelled("任务已取消")
     
     def run(self):
         try:
-            print("\n" + "="*60)
-            print("🚀 开始处理视频")
-            print("="*60)
-            
-            # 0. 先尝试获取详细视频信息 (用于更精准的标题)
-            print("\n📡 获取视频元数据...")
-            self.progress.emit(2, "获取视频元数据...")
-            video_meta = VideoInfoFetcher.get_info(self.url)
-            meta_title = video_meta.get('title', '') if video_meta else ""
-            
-            if video_meta:
-                print(f"✓ 视频标题: {meta_title}")
-                print(f"✓ UP主: {video_meta.get('owner', '未知')}")
-                print(f"✓ BV号: {video_meta.get('bvid', '')}")
-            
-            # 1. 下载视频 (代理方式)
-            print("\n⬇️  开始下载视频...")
-            self.progress.emit(5, "初始化下载器...")
-            downloader = VideoDownloader(self.temp_dir)
-            download_result = downloader.download_video(
-                self.url, 
-                progress_callback=self.progress.emit
-            )
-            
-            # 如果 meta_title 为空，使用下载器获取的标题
-            final_title = meta_title or download_result.get('title', 'Unknown')
-            duration = download_result.get('duration', 0)
-            print(f"✓ 音频下载完成 (时长: {int(duration//60)}分{int(duration%60)}秒)")
-            
-            # 2. 处理音频
-            print("\n🎵 处理音频格式...")
-            processor = AudioProcessor()
-            processed_audio = processor.process_audio(
-                download_result['video_path'],
-                progress_callback=self.progress.emit
-            )
-            
-            # 获取音频文件大小
-            import os
-            audio_size = os.path.getsize(processed_audio)
-            if audio_size >= 1024 * 1024:
-                size_str = f"{audio_size / (1024 * 1024):.2f} MB"
-            else:
-                size_str = f"{audio_size / 1024:.2f} KB"
-            
-            print(f"✓ 音频处理完成")
-            print(f"  - 文件路径: {processed_audio}")
-            print(f"  - 萃取后大小: {size_str}")
+            self.temp_dir = tempfile.mkdtemp(prefix=_TEMP_PREFIX)
+            self._log("\n" + "="*60)
+            self._log("🚀 开始处理视频")
+            self._log("="*60)
             
-            # 3. 语音转写
-            print(f"\n🎙️  开始语音转写 (使用 {self.model} 模型)...")
-            model_to_use = self.custom_model_path if self.custom_model_path else self.model
-            transcriber = Transcriber(model_to_use, api_key=self.api_key)
-            transcribe_result = transcriber.transcribe(
-                processed_audio,
-                progress_callback=self.progress.emit
-            )
-            
-            detected_lang = transcribe_result.get('language', 'unknown')
-            text_length = len(transcribe_result.get('text', ''))
-            print(f"✓ 转写完成")
-            print(f"  - 检测到的语言: {detected_lang}")
-            print(f"  - 文本长度: {text_length} 字符")
-            
-            # 4. 生成总结 (使用用户选择的GPT模型)
-            print(f"\n🤖 使用 {self.gpt_model} 生成总结...")
-            summarizer = Summarizer(self.api_key)
-            summary_result = summarizer.generate_summary(
-                transcribe_result['text'],
-                video_title=final_title,
-                model=self.gpt_model,
-                progress_callback=self.progress.emit
-            )
-            
-            print("✓ 总结生成完成")
-            
-            print("\n📂 正在保存结果...")
-            self.progress.emit(98, "正在保存文件...")
-            
-            # 6. 保存 Markdown (只输出这一个文件)
-            safe_title = safe_filename(final_title)
-            # 使用简单的标题作为文件名
-            md_filename = f"{safe_title}.md"
-            md_filepath = os.path.join(self.output_dir, md_filename)
-            
-            # 避免重名覆盖
-            if os.path.exists(md_filepath):
-                timestamp_str = datetime.now().strftime("%Y%m%d_%H%M")
-                md_filename = f"{safe_title}_{timestamp_str}.md"
-                md_filepath = os.path.join(self.output_dir, md_filename)
-
-            md_content = f"# {final_title}\n\n"
-            md_content += f"**URL**: {self.url}\n"
-            md_content += f"**日期**: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
-            md_content += f"## 💡 核心总结\n\n{summary_result.get('summary', '')}\n\n"
-            md_content += f"## 📑 详细大纲\n\n{summary_result.get('outline', '')}\n\n"
-            md_content += f"## 💎 价值内容\n\n{summary_result.get('value_content', '')}\n\n"
-            md_content += f"---\n\n## 📝 语音转写原文\n\n{transcribe_result['text']}"
-            
-            with open(md_filepath, 'w', encoding='utf-8') as f:
-                f.write(md_content)
-                
-            print(f"✓ 文件已保存至: {md_filepath}")
-            self.progress.emit(100, "处理完成！")
-            
-            # 返回结果，包含路径信息
-            result = {
-                'title': final_title,
-                'md_path': md_filepath,
-                'duration': download_result.get('duration', 0),
-                'language': transcribe_result.get('language', ''),
-                'summary': summary_result.get('summary', ''),
-                'outline': summary_result.get('outline', ''),
-                'value_content': summary_result.get('value_content', ''),
-                'transcript': transcribe_result.get('text', ''),
-                'timestamp': datetime.now().isoformat()
-            }
-            if video_meta:
-                result['owner'] = video_meta.get('owner')
-                result['bvid'] = video_meta.get('bvid')
+            if self.resume_from:
+                # 从检查点恢复：直接从总结步骤开始
+                self._log(f"♻️ 从检查点恢复: {self.resume_from}")
+                with open(self.resume_from, 'r', encoding='utf-8') as f:
+                    job = json.load(f)
+                job['checkpoint'] = self.resume_from
+                self._stage_summarize(job)
+                return
             
-            self.finished.emit(result)
+            job = self._stage_download()
+            self._stage_audio(job)
+            chunks = self._stage_transcribe(job)
+            self._stage_summarize(job, chunks)
             
+        except TaskCancelled:
+            self._log("\n⚠️ 任务已取消")
+        
         except Exception as e:
-            self.error.emit(str(e))
+            # 组件可能把取消时抛出的 TaskCancelled 包装成其他异常，已请求取消时不当作错误上报
+            if self._cancel.is_set():
+                self._log("\n⚠️ 任务已取消")
+            else:
+                self.error.emit(str(e))
         
         finally:
-            # 清理临时文件
+            # 清理临时文件：结果信号已先发出，删除数百 MB 的下载文件放到线程池中进行，
+            # 不拖慢“完成”的呈现；Windows 上异步删除收益不大，直接同步删除
+            if self.temp_dir:
+                if os.name == 'nt':
+                    shutil.rmtree(self.temp_dir, ignore_errors=True)
+                else:
+                    QThreadPool.globalInstance().start(_RemoveTreeTask(self.temp_dir))
+    
+    def _stage_progress(self, stage: str) -> Callable[[float, str], None]:
+        """返回某阶段的进度回调：把组件上报的进度映射到该阶段的总进度区间，且总进度只增不减"""
+        (src_lo, src_hi), (dst_lo, dst_hi) = self._STAGE_PROGRESS[stage]
+        scale = (dst_hi - dst_lo) / (src_hi - src_lo)
+        
+        def report(percent: float, status: str):
+            self._check_cancel()
+            mapped = dst_lo + (min(max(percent, src_lo), src_hi) - src_lo) * scale
+            with self._progress_lock:
+                self._percent = max(self._percent, mapped)
+                percent = self._percent
+            self._emit_progress(percent, status)
+        
+        return report
+    
+    def _emit_progress(self, percent: float, status: str, force: bool = False):
+        """
+        限流发送进度信号：跨线程的每次 emit 都会向主线程事件循环投递一个事件，
+        转写时回调极其频繁，同一整数百分比内 30ms 以内的更新直接丢弃
+        """
+        now = time.monotonic()
+        with self._progress_lock:
+            last_pct, last_time = self._last_emit
+            if not force and int(percent) == last_pct and now - last_time < self._PROGRESS_INTERVAL:
+                return
+            self._last_emit = (int(percent), now)
+        self.progress.emit(percent, status)
+    
+    def _log(self, message: str = ""):
+        """输出日志行 (经 log 信号交给主窗口批量输出，不在工作线程中逐行写终端)"""
+        self.log.emit(message)
+    
+    def _stage_download(self) -> dict:
+        """阶段 1：获取元数据并下载音频 (两者互不依赖，并行进行)，返回任务字典"""
+        from core.downloader import VideoDownloader
+        
+        report = self._stage_progress('download')
+        self._check_cancel()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as pool:
+            if self.preloaded_meta:
+                # 预览时已获取过元数据，直接使用
+                report(0, "使用已获取的视频元数据")
+                meta_future = None
+            else:
+                self._log("\n📡 获取视频元数据...")
+                report(0, "获取视频元数据...")
+                meta_future = pool.submit(VideoInfoFetcher.get_info, self.url)
+            
+            # 下载视频 (代理方式)
+            self._log("\n⬇️  开始下载视频...")
+            downloader = VideoDownloader(self.temp_dir)
+            download_result = downloader.download_video(self.url, progress_callback=report)
+            video_meta = meta_future.result() if meta_future else self.preloaded_meta
+        
+        meta_title = video_meta.get('title', '') if video_meta else ""
+        if video_meta:
+            self._log(f"✓ 视频标题: {meta_title}")
+            self._log(f"✓ UP主: {video_meta.get('owner', '未知')}")
+            self._log(f"✓ BV号: {video_meta.get('bvid', '')}")
+        
+        duration = download_result.get('duration', 0)
+        self._log(f"✓ 音频下载完成 (时长: {int(duration//60)}分{int(duration%60)}秒)")
+        
+        return {
+            'url': self.url,
+            'meta': video_meta,
+            # 如果 meta_title 为空，使用下载器获取的标题
+            'title': meta_title or download_result.get('title', 'Unknown'),
+            'download': download_result,
+        }
+    
+    def _stage_audio(self, job: dict):
+        """阶段 2：转换音频格式"""
+        from core.audio_processor import AudioProcessor
+        
+        report = self._stage_progress('audio')
+        self._log("\n🎵 处理音频格式...")
+        processor = AudioProcessor(trim_silence=self.trim_silence, cancel=self._cancel)
+        processed_audio = processor.process_audio(
+            job['download']['video_path'],
+            progress_callback=report,
+            duration=job['download'].get('duration', 0)
+        )
+        
+        # 获取音频文件大小
+        audio_size = os.stat(processed_audio).st_size
+        if audio_size >= 1024 * 1024:
+            size_str = f"{audio_size / (1024 * 1024):.2f} MB"
+        else:
+            size_str = f"{audio_size / 1024:.2f} KB"
+        
+        self._log(f"✓ 音频处理完成")
+        self._log(f"  - 文件路径: {processed_audio}")
+        self._log(f"  - 萃取后大小: {size_str}")
+        
+        job['audio_path'] = processed_audio
+    
+    def _stage_transcribe(self, job: dict) -> list:
+        """
+        阶段 3：语音转写
+        
+        分片转写时按顺序收集每段文本并返回，保存时逐段写出原文
+        """
+        from core.transcriber import Transcriber
+        
+        report = self._stage_progress('transcribe')
+        self._log(f"\n🎙️  开始语音转写 (使用 {self.model} 模型)...")
+        model_to_use = self.custom_model_path if self.custom_model_path else self.model
+        transcriber = Transcriber(model_to_use, api_key=self.api_key, cancel=self._cancel)
+        # 单独存放而不写入 job，保存检查点时不会带上重复的片段
+        chunks = []
+        
+        def collect(index: int, text: str):
+            chunks.append(text)
+            self._log(f"  -> 已完成转写片段 {index + 1}")
+        
+        transcribe_result = transcriber.transcribe(
+            job['audio_path'],
+            progress_callback=report,
+            text_sink=collect
+        )
+        
+        detected_lang = transcribe_result.get('language', 'unknown')
+        text_length = len(transcribe_result.get('text', ''))
+        self._log(f"✓ 转写完成")
+        self._log(f"  - 检测到的语言: {detected_lang}")
+        self._log(f"  - 文本长度: {text_length} 字符")
+        
+        job['transcript'] = transcribe_result
+        self._save_checkpoint(job)
+        return chunks
+    
+    def _stage_summarize(self, job: dict, chunks: Optional[list] = None):
+        """阶段 4：生成总结并保存 Markdown"""
+        from core.summarizer import Summarizer
+        
+        report = self._stage_progress('summarize')
+        try:
+            self._summarize_job(Summarizer(self.api_key), job, report, chunks or None)
+        except Exception:
+            # 转写结果来之不易，总结失败或被取消时保留检查点，之后可直接从总结步骤恢复
+            self._keep_checkpoint(job)
+            raise
+        self._discard_checkpoint(job)
+    
+    def _summarize_job(self, summarizer, job: dict, report: Callable[[float, str], None], chunks: Optional[list] = None):
+        """生成单个任务的总结并保存 Markdown (chunks: 按顺序收到的转写片段，用于分段写出原文)"""
+        # 4. 生成总结 (使用用户选择的GPT模型)
+        self._log(f"\n🤖 使用 {self.gpt_model} 生成总结...")
+        transcribe_result = job['transcript']
+        final_title = job['title']
+        summary_result = summarizer.generate_summary(
+            transcribe_result['text'],
+            video_title=final_title,
+            model=self.gpt_model,
+            progress_callback=report
+        )
+
+        self._log("✓ 总结生成完成")
+
+        self._log("\n📂 正在保存结果...")
+        self._emit_progress(98, "正在保存文件...", force=True)
+
+        # 6. 保存 Markdown (只输出这一个文件)
+        safe_title = safe_filename(final_title)
+        
+        # 先写独占创建的临时文件并落盘，再发布为第一个不存在的文件名：
+        # 使用简单的标题作为文件名，已存在时改用带时间戳的文件名 (绝不覆盖已有文件)；
+        # 发布前不创建任何占位文件，中途失败、取消或被终止都不会留下空的或写了一半的 .md
+        fd, tmp_path = create_temp_file(self.output_dir, '.md.tmp')
+        try:
+            # 逐段写入，不在内存中拼出整篇文档 (转写原文可能有数十 MB)
+            with os.fdopen(fd, 'w', encoding='utf-8', buffering=1 << 20) as f:
+                f.write(f"# {final_title}\n\n")
+                f.write(f"**URL**: {job['url']}\n")
+                f.write(f"**日期**: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+                f.write(f"## 💡 核心总结\n\n{summary_result.get('summary', '')}\n\n")
+                f.write(f"## 📑 详细大纲\n\n{summary_result.get('outline', '')}\n\n")
+                f.write(f"## 💎 价值内容\n\n{summary_result.get('value_content', '')}\n\n")
+                f.write("---\n\n## 📝 语音转写原文\n\n")
+                self._write_transcript(f, transcribe_result['text'], chunks)
+                f.flush()
+                os.fsync(f.fileno())
+            md_filepath = publish_new_file(tmp_path, output_name_candidates(self.output_dir, safe_title))
+        except BaseException:
             try:
-                if os.path.exists(self.temp_dir):
-                    shutil.rmtree(self.temp_dir)
-            except Exception:
+                os.remove(tmp_path)
+            except OSError:
                 pass
+            raise
+
+        self._log(f"✓ 文件已保存至: {md_filepath}")
+        self._emit_progress(100, "处理完成！", force=True)
+
+        # 返回结果，包含路径信息
+        video_meta = job['meta']
+        result = {
+            'title': final_title,
+            'url': job['url'],
+            'md_path': md_filepath,
+            'duration': job['download'].get('duration', 0),
+            'language': transcribe_result.get('language', ''),
+            'summary': summary_result.get('summary', ''),
+            'outline': summary_result.get('outline', ''),
+            'value_content': summary_result.get('value_content', ''),
+            'transcript': transcribe_result.get('text', ''),
+            'timestamp': datetime.now().isoformat()
+        }
+        if video_meta:
+            result['owner'] = video_meta.get('owner')
+            result['bvid'] = video_meta.get('bvid')
+
+        self.finished.emit(result)
+    
+    def _save_checkpoint(self, job: dict):
+        """转写完成后立即把任务信息与转写结果写入临时目录，总结失败时不必重新转写"""
+        path = os.path.join(self.temp_dir, _CHECKPOINT_NAME)
+        try:
+            data = json.dumps(job, ensure_ascii=False, default=str)
+            with open(path, 'wb') as f:
+                f.write(data.encode('utf-8'))
+            job['checkpoint'] = path
+        except (OSError, TypeError, ValueError) as e:
+            self._log(f"⚠️ 保存转写检查点失败: {e}")
+    
+    def _keep_checkpoint(self, job: dict):
+        """把临时目录中的检查点移到恢复目录 (临时目录随后会被清理)"""
+        path = job.get('checkpoint')
+        if not path or not os.path.exists(path) or os.path.dirname(path) == RESUME_DIR:
+            return
+        try:
+            os.makedirs(RESUME_DIR, exist_ok=True)
+            name = os.path.basename(os.path.dirname(path)) + ".json"
+            dst = shutil.move(path, os.path.join(RESUME_DIR, name))
+            self._log(f"💾 转写结果已保留，可稍后恢复: {dst}")
+        except OSError as e:
+            self._log(f"⚠️ 保留转写检查点失败: {e}")
+    
+    def _discard_checkpoint(self, job: dict):
+        """总结成功后删除恢复用的检查点 (本次运行临时目录中的检查点随目录一起清理)"""
+        path = job.get('checkpoint')
+        if not path or not self.resume_from:
+            return
+        parent = os.path.dirname(path)
+        if os.path.basename(parent).startswith(_TEMP_PREFIX):
+            # 来自异常退出残留的临时目录，连同目录一起清理
+            shutil.rmtree(parent, ignore_errors=True)
+        else:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    
+    @staticmethod
+    def find_checkpoints() -> list:
+        """
+        查找可恢复的检查点：恢复目录中保留的，以及程序异常退出后残留在临时目录中的
+        
+        Returns:
+            [(检查点路径, 视频标题), ...]，按修改时间从新到旧
+        """
+        paths = glob.glob(os.path.join(RESUME_DIR, "*.json"))
+        paths += glob.glob(os.path.join(tempfile.gettempdir(), _TEMP_PREFIX + "*", _CHECKPOINT_NAME))
+        found = []
+        for path in paths:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    job = json.load(f)
+                found.append((os.path.getmtime(path), path, job.get('title') or job.get('url', '')))
+            except (OSError, ValueError):
+                continue
+        found.sort(reverse=True)
+        return [(path, title) for _, path, title in found]
+    
+    @staticmethod
+    def _write_transcript(f, text: str, chunks: Optional[list]):
+        """写入转写原文；已按片段收到时逐段写出 (片段以空行拼接后与全文一致才使用)"""
+        if chunks and sum(map(len, chunks)) + 2 * (len(chunks) - 1) == len(text):
+            for i, chunk in enumerate(chunks):
+                if i:
+                    f.write("\n\n")
+                f.write(chunk)
+        else:
+            f.write(text)
 
 
 class MainWindow(QMainWindow):
@@ -205,7 +524,13 @@ class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         self.config = Config()
+        self._home = os.path.expanduser('~')  # 只解析一次，传给处理线程复用
         self.process_thread: Optional[ProcessThread] = None
+        self.info_thread: Optional[VideoInfoThread] = None
+        self._stale_info_threads: list = []  # 已取消但尚未结束的预览线程
+        self.scan_thread: Optional[CacheScanThread] = None
+        self._closing = False  # 已请求关闭，正在等待后台处理线程退出
+        self._last_preview_meta: dict = {}  # {'url': 预览的链接, 'info': 视频信息}
         
         self.init_ui()
         self.load_settings()
@@ -306,11 +631,16 @@ class MainWindow(QMainWindow):
         path_hbox.addWidget(self.browse_model_btn)
         settings_layout.addLayout(path_hbox, 4, 1)
         
+        # 去除静音段复选框
+        self.trim_silence_check = QCheckBox("去除静音段 (加快转写)")
+        self.trim_silence_check.setToolTip("删除音频中超过 1 秒的停顿，转写更快，但转写时间戳将与视频不对应")
+        settings_layout.addWidget(self.trim_silence_check, 5, 1)
+        
         # 卸载模型按钮
-        self.unload_model_btn = QPushButton("🗑️ 清理模型缓存 (释放硬盘)")
+        self.unload_model_btn = QPushButton("🗑️ 清理模型与处理缓存 (释放硬盘)")
         self.unload_model_btn.setProperty("secondary", True)
         self.unload_model_btn.clicked.connect(self.unload_whisper_model)
-        settings_layout.addWidget(self.unload_model_btn, 5, 0, 1, 2)
+        settings_layout.addWidget(self.unload_model_btn, 6, 0, 1, 2)
         
         sidebar_layout.addWidget(settings_group)
         
@@ -331,6 +661,12 @@ class MainWindow(QMainWindow):
         self.process_btn.clicked.connect(self.start_process)
         input_layout.addWidget(self.process_btn)
         
+        self.resume_btn = QPushButton("♻️ 恢复未完成的总结")
+        self.resume_btn.setProperty("secondary", True)
+        self.resume_btn.setToolTip("转写已完成但总结失败或中断的任务，可跳过下载与转写直接重新总结")
+        self.resume_btn.clicked.connect(self.resume_process)
+        input_layout.addWidget(self.resume_btn)
+        
         sidebar_layout.addWidget(input_group)
         
         # === 视频预览区域 (默认隐藏) ===
@@ -349,7 +685,11 @@ class MainWindow(QMainWindow):
         
         sidebar_layout.addWidget(self.video_info_group)
         
-        # 绑定 URL 变化事件
+        # 绑定 URL 变化事件 (防抖：停止输入 250ms 后才获取预览，避免每次按键都发请求)
+        self._url_debounce = QTimer(self)
+        self._url_debounce.setSingleShot(True)
+        self._url_debounce.setInterval(250)
+        self._url_debounce.timeout.connect(self.fetch_video_preview)
         self.url_input.textChanged.connect(self.on_url_changed)
         
         # === 进度区域 ===
@@ -383,6 +723,8 @@ class MainWindow(QMainWindow):
         
         self.result_tabs = QTabWidget()
         self.result_tabs.setDocumentMode(True)
+        self._pending_tab_text: dict = {}  # 标签页序号 -> 尚未填充的文本
+        self.result_tabs.currentChanged.connect(self._render_pending_tab)
         
         # 主要内容与评价
         self.summary_text = QTextEdit()
@@ -399,11 +741,21 @@ class MainWindow(QMainWindow):
         self.value_text.setReadOnly(True)
         self.result_tabs.addTab(self.value_text, "💡 价值内容")
         
-        # 原始转写
-        self.transcript_text = QTextEdit()
+        # 原始转写 (QPlainTextEdit 对长文本的排版开销远小于 QTextEdit)
+        self.transcript_text = QPlainTextEdit()
         self.transcript_text.setReadOnly(True)
         self.result_tabs.addTab(self.transcript_text, "📄 完整转录")
         
+        # 运行日志 (处理线程的日志行先进缓冲区，每 100ms 批量追加一次)
+        self.log_text = QPlainTextEdit()
+        self.log_text.setReadOnly(True)
+        self.log_text.setMaximumBlockCount(5000)
+        self.result_tabs.addTab(self.log_text, "🧾 运行日志")
+        self._log_buffer = deque()
+        self._log_timer = QTimer(self)
+        self._log_timer.setInterval(100)
+        self._log_timer.timeout.connect(self.flush_log)
+        
         result_layout.addWidget(self.result_tabs)
         
         # 底部操作栏
@@ -459,16 +811,17 @@ class MainWindow(QMainWindow):
             self.gpt_model_combo.setCurrentText(gpt_model)
     
     def save_settings(self):
-        """保存设置"""
-        self.config.set_api_key(self.api_key_input.text().strip())
-        
-        if self.model_combo.currentText() == '自定义路径...':
-            self.config.set_whisper_model(self.custom_model_input.text().strip())
-        else:
-            self.config.set_whisper_model(self.model_combo.currentText())
-        
-        # 保存GPT模型选择
-        self.config.set_gpt_model(self.gpt_model_combo.currentText())
+        """保存设置 (多项改动合并为一次写入)"""
+        with self.config.batch():
+            self.config.set_api_key(self.api_key_input.text().strip())
+            
+            if self.model_combo.currentText() == '自定义路径...':
+                self.config.set_whisper_model(self.custom_model_input.text().strip())
+            else:
+                self.config.set_whisper_model(self.model_combo.currentText())
+            
+            # 保存GPT模型选择
+            self.config.set_gpt_model(self.gpt_model_combo.currentText())
     
     def toggle_api_key_visibility(self):
         """切换API Key显示状态"""
@@ -496,39 +849,30 @@ class MainWindow(QMainWindow):
             self.custom_model_input.setText(path)
 
     def unload_whisper_model(self):
-        """卸载模型并清理硬盘缓存"""
+        """卸载模型并清理硬盘缓存 (扫描在后台线程进行，完成后在 _on_scan_done 中确认)"""
+        # 1. 清理内存中的模型（如果有）
+        # 注意：由于模型是在线程中加载的，且线程结束后会自动释放，这里主要清理硬盘
+        if self.scan_thread and self.scan_thread.isRunning():
+            return
+        
+        self.unload_model_btn.setEnabled(False)
+        self.statusBar.showMessage("正在扫描缓存...")
+        self.scan_thread = CacheScanThread()
+        self.scan_thread.scan_done.connect(self._on_scan_done)
+        self.scan_thread.error.connect(self._on_scan_error)
+        self.scan_thread.start()
+    
+    def _on_scan_error(self, error: str):
+        self.unload_model_btn.setEnabled(True)
+        QMessageBox.warning(self, "错误", f"清理失败: {error}")
+    
+    def _on_scan_done(self, total_size: int, found_dirs: list):
+        """缓存扫描完成 (主线程)：确认后删除"""
+        self.unload_model_btn.setEnabled(True)
+        self.statusBar.showMessage("就绪")
         try:
-            # 1. 清理内存中的模型（如果有）
-            # 注意：由于模型是在线程中加载的，且线程结束后会自动释放，这里主要清理硬盘
-            
-            # 2. 清理硬盘缓存 
-            # faster-whisper 使用 HuggingFace cache (~/.cache/huggingface/hub)
-            hf_cache_dir = os.path.expanduser("~/.cache/huggingface/hub")
-            # 同时也检查旧的 whisper 缓存
-            old_cache_dir = os.path.expanduser("~/.cache/whisper")
-            
-            total_size = 0
-            found_dirs = []
-            
-            # 扫描 HuggingFace 缓存 (只扫描 whisper 相关的)
-            if os.path.exists(hf_cache_dir):
-                for d in os.listdir(hf_cache_dir):
-                    if "whisper" in d.lower():
-                        full_path = os.path.join(hf_cache_dir, d)
-                        size = sum(os.path.getsize(os.path.join(dirpath, filename)) for dirpath, _, filenames in os.walk(full_path) for filename in filenames)
-                        total_size += size
-                        found_dirs.append(full_path)
-
-            # 扫描旧缓存
-            if os.path.exists(old_cache_dir):
-                files = os.listdir(old_cache_dir)
-                if files:
-                   size = sum(os.path.getsize(os.path.join(old_cache_dir, f)) for f in files)
-                   total_size += size
-                   found_dirs.append(old_cache_dir)
-            
             if total_size == 0:
-                QMessageBox.information(self, "清理完成", "未发现 Whisper 模型缓存。")
+                QMessageBox.information(self, "清理完成", "未发现 Whisper 模型缓存或处理缓存。")
                 return
 
             size_mb = total_size / (1024 * 1024)
@@ -536,7 +880,7 @@ class MainWindow(QMainWindow):
                 
             reply = QMessageBox.question(
                 self, "确认清理", 
-                f"检测到缓存模型文件，共占用 {size_str} 硬盘空间。\n\n"
+                f"检测到模型缓存与处理缓存 (下载、音频、转写、总结)，共占用 {size_str} 硬盘空间。\n\n"
                 "确定要全部删除吗？\n"
                 "(下次使用时需要重新下载)",
                 QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
@@ -544,9 +888,9 @@ class MainWindow(QMainWindow):
             )
             
             if reply == QMessageBox.StandardButton.Yes:
-                import shutil
+                old_cache_dir = CacheScanThread.OLD_CACHE_DIR
                 for d in found_dirs:
-                    if os.path.isfile(d): # 虽然目前逻辑d都是目录，但为了安全
+                    if os.path.isfile(d):  # 处理缓存根目录下可能有单个文件
                         os.remove(d)
                     else:
                         shutil.rmtree(d)
@@ -554,7 +898,7 @@ class MainWindow(QMainWindow):
                         if d == old_cache_dir:
                             os.makedirs(d)
                             
-                QMessageBox.information(self, "成功", "已清空模型缓存，释放了硬盘空间！")
+                QMessageBox.information(self, "成功", "已清空缓存，释放了硬盘空间！")
                 self.statusBar.showMessage(f"已释放 {size_str} 硬盘空间")
             else:
                 QMessageBox.information(self, "提示", "未找到默认缓存目录，可能暂无缓存。")
@@ -600,10 +944,12 @@ class MainWindow(QMainWindow):
         self.save_settings()
         
         # 清空结果
+        self._pending_tab_text = {}
         self.summary_text.clear()
         self.outline_text.clear()
         self.value_text.clear()
-        self.transcript_text.clear()
+        self.set_transcript_text("")
+        self.log_text.clear()
         self.export_btn.setEnabled(False)
         
         # 禁用输入
@@ -629,8 +975,61 @@ class MainWindow(QMainWindow):
         
         # 启动处理线程
         output_dir = self.config.get_output_dir()
-        self.process_thread = ProcessThread(url, api_key, model, custom_path, gpt_model, output_dir=output_dir)
+        # 预览的正是当前链接时，把已获取的元数据交给处理线程，省去一次请求
+        preloaded_meta = None
+        if self._last_preview_meta.get('url') == url:
+            preloaded_meta = self._last_preview_meta['info']
+        self.process_thread = ProcessThread(
+            url, api_key, model, custom_path, gpt_model,
+            output_dir=output_dir,
+            home=self._home,
+            preloaded_meta=preloaded_meta,
+            trim_silence=self.trim_silence_check.isChecked()
+        )
+        self.process_thread.progress.connect(self.on_progress)
+        self.process_thread.log.connect(self._log_buffer.append)
+        self._log_timer.start()
+        self.process_thread.finished.connect(self.on_finished)
+        self.process_thread.error.connect(self.on_error)
+        self.process_thread.start()
+    
+    def resume_process(self):
+        """从转写检查点恢复：选择一个未完成的任务，直接重新生成总结"""
+        api_key = self.api_key_input.text().strip()
+        if not api_key:
+            QMessageBox.warning(self, "输入错误", "请输入OpenAI API Key")
+            return
+        
+        checkpoints = ProcessThread.find_checkpoints()
+        if not checkpoints:
+            QMessageBox.information(self, "恢复任务", "没有可恢复的任务。")
+            return
+        
+        labels = [f"{title}  ({os.path.basename(path)})" for path, title in checkpoints]
+        label, ok = QInputDialog.getItem(self, "恢复任务", "选择要重新总结的视频:", labels, 0, False)
+        if not ok:
+            return
+        path = checkpoints[labels.index(label)][0]
+        
+        self.save_settings()
+        self._pending_tab_text = {}
+        self.summary_text.clear()
+        self.outline_text.clear()
+        self.value_text.clear()
+        self.set_transcript_text("")
+        self.log_text.clear()
+        self.export_btn.setEnabled(False)
+        self.set_inputs_enabled(False)
+        
+        self.process_thread = ProcessThread(
+            "", api_key, self.model_combo.currentText(), "", self.gpt_model_combo.currentText(),
+            output_dir=self.config.get_output_dir(),
+            home=self._home,
+            resume_from=path
+        )
         self.process_thread.progress.connect(self.on_progress)
+        self.process_thread.log.connect(self._log_buffer.append)
+        self._log_timer.start()
         self.process_thread.finished.connect(self.on_finished)
         self.process_thread.error.connect(self.on_error)
         self.process_thread.start()
@@ -642,7 +1041,22 @@ class MainWindow(QMainWindow):
         self.custom_model_input.setEnabled(enabled)
         self.url_input.setEnabled(enabled)
         self.process_btn.setEnabled(enabled)
+        self.resume_btn.setEnabled(enabled)
         self.browse_model_btn.setEnabled(enabled)
+        self.trim_silence_check.setEnabled(enabled)
+    
+    def flush_log(self):
+        """把缓冲的日志行一次性输出到日志面板与终端"""
+        if not self._log_buffer:
+            if not (self.process_thread and self.process_thread.isRunning()):
+                self._log_timer.stop()
+            return
+        lines = []
+        while self._log_buffer:
+            lines.append(self._log_buffer.popleft())
+        text = "\n".join(lines)
+        self.log_text.appendPlainText(text)
+        print(text, flush=True)
     
     def on_progress(self, percent: float, status: str):
         """更新进度"""
@@ -658,15 +1072,26 @@ class MainWindow(QMainWindow):
         self.statusBar.showMessage(f"完成: {result.get('title', '')}")
         
         # 显示结果
-        self.summary_text.setPlainText(result.get('summary', ''))
-        self.outline_text.setPlainText(result.get('outline', ''))
-        self.value_text.setPlainText(result.get('value_content', ''))
-        self.transcript_text.setPlainText(result.get('transcript', ''))
+        # 只填充当前可见的标签页，其余在首次切换过去时再填充 (见 _render_pending_tab)
+        self._pending_tab_text = {
+            self.result_tabs.indexOf(self.summary_text): result.get('summary', ''),
+            self.result_tabs.indexOf(self.outline_text): result.get('outline', ''),
+            self.result_tabs.indexOf(self.value_text): result.get('value_content', ''),
+            self.result_tabs.indexOf(self.transcript_text): result.get('transcript', ''),
+        }
+        self._render_pending_tab(self.result_tabs.currentIndex())
         
         self.export_btn.setEnabled(True)
         
         # 保存当前结果供导出
         self._current_result = result
+        self.config.add_to_history({
+            'title': result.get('title', ''),
+            'url': result.get('url', ''),
+            'bvid': result.get('bvid'),
+            'md_path': result.get('md_path', ''),
+            'timestamp': result.get('timestamp', '')
+        })
         
         # 弹窗提示并询问是否打开文件夹
         # 弹窗提示并询问是否打开文件
@@ -679,14 +1104,61 @@ class MainWindow(QMainWindow):
                 QMessageBox.StandardButton.Yes
             )
             if reply == QMessageBox.StandardButton.Yes:
-                import subprocess
-                try:
-                    if os.name == 'nt': # Windows
-                        os.startfile(md_path)
-                    else: # macOS / Linux
-                        subprocess.run(['open', md_path])
-                except:
-                    pass
+                self.open_file(md_path)
+    
+    @staticmethod
+    def open_file(path: str):
+        """用系统默认程序打开文件 (不等待其退出，界面不会被阻塞)"""
+        try:
+            if os.name == 'nt': # Windows
+                os.startfile(path)
+            elif sys.platform == 'darwin': # macOS
+                subprocess.Popen(['open', path], start_new_session=True)
+            else: # Linux 等
+                subprocess.Popen(['xdg-open', path], start_new_session=True,
+                                 stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        except OSError as e:
+            print(f"⚠️ 无法打开文件: {e}")
+    
+    def _render_pending_tab(self, index: int):
+        """标签页首次显示时才填充文本，用户没看的标签页不必排版"""
+        text = self._pending_tab_text.pop(index, None)
+        if text is None:
+            return
+        widget = self.result_tabs.widget(index)
+        if widget is self.transcript_text:
+            self.set_transcript_text(text)
+        else:
+            widget.setPlainText(text)
+
+    _TRANSCRIPT_SLICE = 64 * 1024  # 每次事件循环追加的字符数
+
+    def set_transcript_text(self, text: str):
+        """
+        分片填充转写原文：每次追加 64K 字符后让出事件循环，
+        长视频的数 MB 文本不会在结果出来的瞬间卡住界面
+        """
+        self._transcript_generation = getattr(self, '_transcript_generation', 0) + 1
+        self.transcript_text.setUpdatesEnabled(True)
+        self.transcript_text.clear()
+        if not text:
+            return
+        self.transcript_text.setUpdatesEnabled(False)
+        self._append_transcript_slice(text, 0, self._transcript_generation)
+
+    def _append_transcript_slice(self, text: str, pos: int, generation: int):
+        if generation != self._transcript_generation:
+            return  # 已有新的结果或已清空
+        end = pos + self._TRANSCRIPT_SLICE
+        # 用光标插入而非 appendPlainText，后者会在每片之间多出换行
+        cursor = self.transcript_text.textCursor()
+        cursor.movePosition(QTextCursor.MoveOperation.End)
+        cursor.insertText(text[pos:end])
+        if end < len(text):
+            QTimer.singleShot(0, lambda: self._append_transcript_slice(text, end, generation))
+        else:
+            self.transcript_text.setUpdatesEnabled(True)
+            self.transcript_text.moveCursor(QTextCursor.MoveOperation.Start)
     
     def on_error(self, error: str):
         """处理错误"""
@@ -719,7 +1191,20 @@ class MainWindow(QMainWindow):
         if not path:
             return
         
-        # 生成Markdown内容
+        # 处理时已保存过 Markdown，直接复制文件 (Linux 上由内核 copy_file_range 完成)
+        md_path = result.get('md_path')
+        if md_path and os.path.exists(md_path):
+            try:
+                shutil.copyfile(md_path, path)
+                QMessageBox.information(self, "导出成功", f"结果已导出到:\n{path}")
+                self.statusBar.showMessage(f"已导出: {path}")
+            except shutil.SameFileError:
+                self.statusBar.showMessage(f"已导出: {path}")
+            except Exception as e:
+                QMessageBox.warning(self, "导出失败", f"导出失败: {str(e)}")
+            return
+        
+        # 源文件已不存在时重新生成Markdown内容
         content = f"""# {result.get('title', '视频总结')}
 
 生成时间: {result.get('timestamp', '')}
@@ -763,21 +1248,53 @@ class MainWindow(QMainWindow):
         """当URL输入框内容改变时"""
         url = text.strip()
         if not url:
+            self._url_debounce.stop()
             self.video_info_group.setVisible(False)
             return
 
-        # 简单验证一下，避免乱搜
-        if not ('BV' in url.upper() or 'av' in url.lower() or 'bilibili.com' in url):
+        # 无法识别出视频 ID 时不去请求，避免乱搜
+        if not parse_bilibili_url(url):
             return
 
-        # 如果已有线程在跑，先不管或停止它
-        if hasattr(self, 'info_thread') and self.info_thread and self.info_thread.isRunning():
-            return # 或者 self.info_thread.terminate()
+        # 重新计时，输入停顿后再获取；旧的请求已过时，立即取消
+        self._cancel_info_thread()
+        self._url_debounce.start()
+
+    def fetch_video_preview(self):
+        """获取当前输入视频的预览信息"""
+        url = self.url_input.text().strip()
+        if not url:
+            return
+
+        # 缓存命中时直接显示，无需启动线程
+        info = VideoInfoFetcher.get_cached(url)
+        if info:
+            self._on_preview_info(url, info)
+            return
+
+        # 取消仍在进行的旧请求，只显示最后一次输入的结果
+        self._cancel_info_thread()
 
         self.info_thread = VideoInfoThread(url)
-        self.info_thread.info_received.connect(self.update_video_preview)
+        self.info_thread.info_received.connect(lambda info, url=url: self._on_preview_info(url, info))
         self.info_thread.start()
 
+    def _cancel_info_thread(self):
+        """取消当前预览线程；线程对象保留到其真正结束，避免运行中被回收"""
+        thread = getattr(self, 'info_thread', None)
+        if thread is None:
+            return
+        self.info_thread = None
+        if thread.isRunning():
+            thread.cancel()
+            self._stale_info_threads.append(thread)
+            thread.finished.connect(lambda: self._stale_info_threads.remove(thread))
+
+    def _on_preview_info(self, url: str, info: dict):
+        """记录最近一次成功的预览结果 (开始处理时复用)，并更新预览面板"""
+        self._last_preview_meta = {'url': url, 'info': info}
+        self.update_video_preview(info)
+
     def update_video_preview(self, info: dict):
         """更新视频预览面板"""
         self.video_title_label.setText(info.get('title', ''))
@@ -791,13 +1308,31 @@ class MainWindow(QMainWindow):
         self.save_settings()
         
         # 停止信息获取线程
-        if hasattr(self, 'info_thread') and self.info_thread and self.info_thread.isRunning():
-            self.info_thread.terminate()
-            self.info_thread.wait()
+        self._url_debounce.stop()
+        # 请求带有超时，取消后最迟数秒内退出；仍未结束才强制终止
+        threads = [t for t in (self.info_thread, *self._stale_info_threads) if t and t.isRunning()]
+        for thread in threads:
+            thread.cancel()
+        for thread in threads:
+            if not thread.wait(6000):
+                thread.terminate()
+                thread.wait()
 
-        # 停止后台处理线程
+        # 停止后台处理线程：请求协作式取消 (子进程随之结束)，不强制终止线程，
+        # 否则 run() 的 finally 不会执行，临时目录与检查点都得不到清理；
+        # 超时仍未退出时暂不关闭窗口，线程结束后再自动关闭
         if self.process_thread and self.process_thread.isRunning():
-            self.process_thread.terminate()
-            self.process_thread.wait()
+            self.process_thread.request_cancel()
+            # 首次最多等待 3 秒；之后每次重试只短暂等待，不阻塞界面
+            if not self.process_thread.wait(100 if self._closing else 3000):
+                self._closing = True
+                self.statusBar.showMessage("正在停止后台任务，完成后自动关闭...")
+                QTimer.singleShot(200, self.close)
+                event.ignore()
+                return
+        
+        # 缓存扫描只读文件系统，等待其结束即可
+        if self.scan_thread and self.scan_thread.isRunning():
+            self.scan_thread.wait()
         
         event.accept()
@@ -3,18 +3,28 @@ utils 模块
 """
 from .config import Config
 from .helpers import (
+    parse_bilibili_url,
     validate_bilibili_url,
+    validate_bilibili_urls,
     format_file_size,
     format_duration,
     ensure_dir,
-    safe_filename
+    safe_filename,
+    output_name_candidates,
+    create_temp_file,
+    publish_new_file
 )
 
 __all__ = [
     'Config',
+    'parse_bilibili_url',
     'validate_bilibili_url',
+    'validate_bilibili_urls',
     'format_file_size',
     'format_duration',
     'ensure_dir',
-    'safe_filename'
+    'safe_filename',
+    'output_name_candidates',
+    'create_temp_file',
+    'publish_new_file'
 ]
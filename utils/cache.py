@@ -0,0 +1,210 @@
+"""
+本地缓存模块
+按内容键缓存各阶段产物（下载的音频、处理后的音频、转写文本、总结），
+重复处理同一视频时直接复用，无需重新下载 / 转码 / 转写 / 调用 API
+"""
+import hashlib
+import json
+import os
+import shutil
+import time
+from typing import Any, Optional
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+
+# 缓存根目录，可通过环境变量 BILI_SUMMARY_NO_CACHE=1 关闭缓存
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'biliSummary')
+ENABLED = os.environ.get('BILI_SUMMARY_NO_CACHE', '0') != '1'
+# 缓存总大小上限，超过后按最近使用时间淘汰最旧的条目 (环境变量 BILI_SUMMARY_CACHE_MAX_MB，默认 5GB)
+MAX_BYTES = int(os.environ.get('BILI_SUMMARY_CACHE_MAX_MB', '5120')) * 1024 * 1024
+# 不参与淘汰与清理的子目录 (恢复用的转写检查点，由界面管理)
+_PERSISTENT = frozenset({'resume'})
+
+
+def make_key(*parts: Any) -> str:
+    """由若干字段组成缓存键"""
+    h = hashlib.sha1()
+    for part in parts:
+        h.update(str(part).encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+def file_digest(path: str) -> str:
+    """计算文件内容摘要（安装了 xxhash 时使用更快的 xxh64，非安全用途）"""
+    h = xxhash.xxh64() if xxhash else hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def link_or_copy(src: str, dst: str):
+    """优先硬链接（零拷贝），跨文件系统时退回复制"""
+    try:
+        if os.path.exists(dst):
+            os.remove(dst)
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def get_file(namespace: str, key: str) -> Optional[str]:
+    """获取缓存的文件路径，未命中返回 None"""
+    if not ENABLED:
+        return None
+    try:
+        with os.scandir(os.path.join(CACHE_DIR, namespace, key)) as it:
+            for entry in it:
+                # 跳过写入中断残留的临时文件
+                if not entry.name.endswith('.tmp'):
+                    # 更新键目录的修改时间，作为淘汰时的最近使用时间
+                    try:
+                        os.utime(os.path.dirname(entry.path))
+                    except OSError:
+                        pass
+                    return entry.path
+    except OSError:
+        pass
+    return None
+
+
+def put_file(namespace: str, key: str, src_path: str) -> Optional[str]:
+    """将文件存入缓存（保留原文件名），返回缓存中的路径"""
+    if not ENABLED:
+        return None
+    entry_dir = os.path.join(CACHE_DIR, namespace, key)
+    try:
+        os.makedirs(entry_dir, exist_ok=True)
+        dst = os.path.join(entry_dir, os.path.basename(src_path))
+        tmp = dst + '.tmp'
+        link_or_copy(src_path, tmp)
+        os.replace(tmp, dst)
+    except OSError as e:
+        print(f"⚠️ 写入缓存失败: {e}")
+        return None
+    evict()
+    return dst if os.path.exists(dst) else None
+
+
+def get_json(namespace: str, key: str, max_age: Optional[float] = None) -> Optional[Any]:
+    """
+    读取缓存的 JSON 数据，未命中返回 None
+    
+    Args:
+        max_age: 有效期（秒），超过后视为未命中；None 表示永久有效
+    """
+    if not ENABLED:
+        return None
+    path = os.path.join(CACHE_DIR, namespace, f"{key}.json")
+    try:
+        if max_age is not None and time.time() - os.path.getmtime(path) > max_age:
+            return None
+        with open(path, 'rb') as f:
+            return json.loads(f.read())
+    except (OSError, ValueError):
+        return None
+
+
+def put_json(namespace: str, key: str, value: Any):
+    """写入 JSON 数据到缓存"""
+    if not ENABLED:
+        return
+    path = os.path.join(CACHE_DIR, namespace, f"{key}.json")
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 先序列化为完整的 UTF-8 字节再一次写入，不经过文本层逐块编码
+        data = json.dumps(value, ensure_ascii=False).encode('utf-8')
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except (OSError, TypeError, ValueError) as e:
+        print(f"⚠️ 写入缓存失败: {e}")
+
+
+def _tree_size(path: str) -> int:
+    """统计目录下所有文件的总大小"""
+    total = 0
+    stack = [path]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    else:
+                        total += entry.stat(follow_symlinks=False).st_size
+        except OSError:
+            pass
+    return total
+
+
+def _iter_entries():
+    """遍历缓存条目，产出 (路径, 大小, 最近使用时间)；文件缓存以键目录为一个条目"""
+    for path in cache_paths():
+        if not os.path.isdir(path):
+            # 根目录下的单个文件 (如旧版本写入的模型副本)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            yield path, st.st_size, st.st_mtime
+            continue
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    try:
+                        mtime = entry.stat(follow_symlinks=False).st_mtime
+                        if entry.is_dir(follow_symlinks=False):
+                            size = _tree_size(entry.path)
+                        else:
+                            size = entry.stat(follow_symlinks=False).st_size
+                    except OSError:
+                        continue
+                    yield entry.path, size, mtime
+        except OSError:
+            continue
+
+
+def cache_paths() -> list:
+    """缓存根目录下可以整体清理的路径 (不含恢复检查点目录)"""
+    try:
+        with os.scandir(CACHE_DIR) as it:
+            return [entry.path for entry in it if entry.name not in _PERSISTENT]
+    except OSError:
+        return []
+
+
+def evict(max_bytes: Optional[int] = None) -> int:
+    """
+    缓存总大小超过上限时，按最近使用时间从旧到新删除条目，直到不超过上限
+    
+    Returns:
+        释放的字节数
+    """
+    if max_bytes is None:
+        max_bytes = MAX_BYTES
+    entries = list(_iter_entries())
+    total = sum(size for _, size, _ in entries)
+    if total <= max_bytes:
+        return 0
+    
+    freed = 0
+    for path, size, _ in sorted(entries, key=lambda e: e[2]):
+        if total <= max_bytes:
+            break
+        try:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        freed += size
+    return freed
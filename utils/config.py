@@ -1,11 +1,72 @@
 """
 配置管理模块
-使用本地JSON文件存储用户配置（保存在程序目录中）
+使用本地JSON文件存储用户配置（保存在程序目录中），历史记录单独存放在 history.jsonl
 """
 import os
+import copy
 import json
-import base64
-from typing import Any
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, Tuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import keyring
+    import keyring.errors
+except ImportError:
+    keyring = None
+
+# 系统钥匙串中 API Key 的服务名与用户名
+KEYRING_SERVICE = 'biliSummaryCLI'
+KEYRING_USER = 'openai'
+
+
+# 历史记录保留条数
+HISTORY_LIMIT = 50
+# 历史日志超过该行数时压缩为最近 HISTORY_LIMIT 条
+HISTORY_COMPACT_LINES = 500
+
+# 进程内已解析的配置: 文件路径 -> (mtime_ns, 配置字典)
+# 文件未被修改时再次创建 Config 只需一次 stat，无需重新读取与解析
+_CONFIG_CACHE: Dict[str, Tuple[int, dict]] = {}
+
+
+def _atomic_write(path: str, data: bytes, mode: int = None):
+    """
+    写入临时文件并 fsync 后原子替换目标文件；失败时删除临时文件并抛出异常
+    
+    Args:
+        mode: 文件权限，创建临时文件时即设置 (写入内容之前)，目标文件出现时即已生效
+    """
+    tmp = path + '.tmp'
+    try:
+        flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0)
+        fd = os.open(tmp, flags, 0o666 if mode is None else mode)
+        with open(fd, 'wb') as f:
+            if mode is not None and hasattr(os, 'fchmod'):
+                # 残留的旧临时文件不会被 os.open 改权限，写入前显式设置
+                os.fchmod(fd, mode)
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def _dumps_line(item: Any) -> bytes:
+    """序列化为一行 JSON (UTF-8 字节，含换行符)"""
+    if orjson:
+        return orjson.dumps(item, option=orjson.OPT_NON_STR_KEYS) + b'\n'
+    return json.dumps(item, ensure_ascii=False).encode('utf-8') + b'\n'
 
 
 class Config:
@@ -17,61 +78,200 @@ class Config:
             config_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
         
         self.config_file = os.path.join(config_dir, 'config.json')
-        self._config = self._load()
+        # 历史记录单独存为追加式日志 (每行一条)，新增记录只追加一行，不重写 config.json
+        self.history_file = os.path.join(config_dir, 'history.jsonl')
+        self._config = None  # 首次访问时才读取并解析配置文件 (见 _cfg)
+        self._dirty = False  # 批量修改期间是否有未保存的改动
+        self._api_key = None  # 已读取的 API Key
+        self._history = None  # 历史记录，新的在前 (首次访问时从日志读取)
+        self._history_lines = 0  # 历史日志当前行数
+        self._whisper_model = None  # 已读取的 Whisper 模型设置
+        self._default_output_dir = None  # 默认输出目录 (首次使用时计算)
+        self._batch_depth = 0
+    
+    @property
+    def _cfg(self) -> dict:
+        """配置字典 (延迟加载：只用到命令行帮助、链接校验等功能时不读盘)"""
+        if self._config is None:
+            self._config = self._load()
+        return self._config
     
     def _load(self) -> dict:
         """加载配置文件"""
-        if os.path.exists(self.config_file):
-            try:
-                with open(self.config_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except (json.JSONDecodeError, IOError):
-                return {}
-        return {}
+        try:
+            st = os.stat(self.config_file)
+        except OSError:
+            return {}
+        
+        cached = _CONFIG_CACHE.get(self.config_file)
+        if cached and cached[0] == st.st_mtime_ns:
+            # 返回副本，避免实例上的修改污染缓存
+            return copy.deepcopy(cached[1])
+        
+        try:
+            with open(self.config_file, 'rb') as f:
+                data = f.read()
+            # 安装了 orjson 时使用更快的解析器
+            config = orjson.loads(data) if orjson else json.loads(data)
+        except (ValueError, IOError):
+            return {}
+        _CONFIG_CACHE[self.config_file] = (st.st_mtime_ns, config)
+        return copy.deepcopy(config)
     
     def _save(self):
-        """保存配置到文件"""
+        """
+        保存配置到文件
+        
+        先在内存中序列化为完整字节，写入临时文件并 fsync 后再原子替换，
+        写入中途崩溃也不会留下被截断的 config.json (丢失 API Key 与历史记录)
+        """
         try:
-            with open(self.config_file, 'w', encoding='utf-8') as f:
-                json.dump(self._config, f, ensure_ascii=False, indent=2)
-        except IOError as e:
+            if orjson:
+                # orjson 直接输出 UTF-8 字节
+                data = orjson.dumps(self._cfg, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+            else:
+                data = json.dumps(self._cfg, ensure_ascii=False, indent=2).encode('utf-8')
+            # 配置文件可能含 API Key，仅允许当前用户读写
+            _atomic_write(self.config_file, data, mode=0o600)
+            _CONFIG_CACHE[self.config_file] = (os.stat(self.config_file).st_mtime_ns, copy.deepcopy(self._cfg))
+        except (IOError, TypeError, ValueError) as e:
             print(f"保存配置失败: {e}")
     
+    @contextmanager
+    def batch(self):
+        """
+        批量修改：块内的多次 set 只在退出时写一次文件 (可嵌套，最外层退出时保存)
+        
+        用法:
+            with config.batch():
+                config.set_whisper_model(...)
+                config.set_gpt_model(...)
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self.flush()
+    
+    def flush(self):
+        """保存尚未写入文件的改动"""
+        if self._dirty:
+            self._dirty = False
+            self._save()
+    
+    def close(self):
+        """关闭前保存未写入的改动"""
+        self.flush()
+    
+    def __del__(self):
+        try:
+            self.flush()
+        except Exception:
+            pass
+    
+    def _mark_dirty(self):
+        """记录改动：批量修改中只标记，否则立即保存"""
+        if self._batch_depth:
+            self._dirty = True
+        else:
+            self._save()
+    
     def get(self, key: str, default: Any = None) -> Any:
         """获取配置值"""
-        return self._config.get(key, default)
+        return self._cfg.get(key, default)
     
     def set(self, key: str, value: Any):
-        """设置配置值并保存"""
-        self._config[key] = value
-        self._save()
+        """设置配置值并保存 (值未变化时不重写文件)"""
+        if key in self._cfg and self._cfg[key] == value:
+            return
+        self._cfg[key] = value
+        self._mark_dirty()
     
     def get_api_key(self) -> str:
-        """获取加密存储的API Key"""
-        encoded = self.get('openai_api_key', '')
-        if encoded:
+        """获取API Key (优先从系统钥匙串读取，结果在实例内缓存)"""
+        if self._api_key is not None:
+            return self._api_key
+        
+        key = ''
+        if keyring is not None:
             try:
-                return base64.b64decode(encoded.encode()).decode()
+                key = keyring.get_password(KEYRING_SERVICE, KEYRING_USER) or ''
             except Exception:
-                return ''
-        return ''
+                key = ''
+        if not key:
+            key = self.get('api_key', '')
+        if not key:
+            key = self._migrate_legacy_api_key()
+        self._api_key = key
+        return key
+    
+    def _migrate_legacy_api_key(self) -> str:
+        """读取旧版本以 base64 编码保存的 API Key，并改存为明文字段"""
+        encoded = self.get('openai_api_key', '')
+        if not encoded:
+            return ''
+        import base64
+        try:
+            key = base64.b64decode(encoded.encode()).decode()
+        except Exception:
+            return ''
+        with self.batch():
+            self.set('api_key', key)
+            self._remove('openai_api_key')
+        return key
     
     def set_api_key(self, key: str):
-        """加密存储API Key"""
-        if key:
-            encoded = base64.b64encode(key.encode()).decode()
-            self.set('openai_api_key', encoded)
-        else:
-            if 'openai_api_key' in self._config:
-                del self._config['openai_api_key']
-                self._save()
+        """
+        存储API Key
+        
+        安装了 keyring 时存入系统凭据管理器 (Windows 凭据管理器 / macOS 钥匙串 / libsecret)，
+        并从配置文件中移除；钥匙串不可用时保存在配置文件中 (文件权限 0600)
+        """
+        if key == self._api_key:
+            return
+        
+        if keyring is not None:
+            try:
+                if key:
+                    keyring.set_password(KEYRING_SERVICE, KEYRING_USER, key)
+                else:
+                    try:
+                        keyring.delete_password(KEYRING_SERVICE, KEYRING_USER)
+                    except keyring.errors.PasswordDeleteError:
+                        pass
+                self._api_key = key
+                with self.batch():
+                    self._remove('api_key')
+                    self._remove('openai_api_key')
+                return
+            except Exception as e:
+                print(f"⚠️ 系统钥匙串不可用，API Key 将保存在配置文件中: {e}")
+        
+        self._api_key = key
+        with self.batch():
+            if key:
+                self.set('api_key', key)
+            else:
+                self._remove('api_key')
+            self._remove('openai_api_key')
+    
+    def _remove(self, key: str):
+        """删除配置项并保存"""
+        if key in self._cfg:
+            del self._cfg[key]
+            self._mark_dirty()
     
     def get_whisper_model(self) -> str:
-        """获取Whisper模型设置"""
-        return self.get('whisper_model', 'base')
+        """获取Whisper模型设置 (结果在实例内缓存)"""
+        if self._whisper_model is None:
+            self._whisper_model = self.get('whisper_model', 'base')
+        return self._whisper_model
     
     def set_whisper_model(self, model: str):
         """保存Whisper模型设置"""
+        self._whisper_model = None
         self.set('whisper_model', model)
     
     def get_custom_model_path(self) -> str:
@@ -83,25 +283,77 @@ class Config:
         self.set('custom_model_path', path)
     
     def get_output_dir(self) -> str:
-        """获取输出目录"""
-        default = os.path.join(os.path.expanduser('~'), 'Downloads')
-        return self.get('output_dir', default)
+        """获取输出目录 (未设置时为 ~/Downloads，只在首次使用时解析主目录)"""
+        output_dir = self.get('output_dir')
+        if output_dir is not None:
+            return output_dir
+        if self._default_output_dir is None:
+            self._default_output_dir = os.path.join(os.path.expanduser('~'), 'Downloads')
+        return self._default_output_dir
     
     def set_output_dir(self, path: str):
         """保存输出目录"""
+        self._default_output_dir = None
         self.set('output_dir', path)
     
-    def get_history(self) -> list:
-        """获取历史记录"""
-        return self.get('history', [])
+    def _history_deque(self) -> deque:
+        """历史记录的内存表示：有界双端队列，头部插入 O(1)，超出上限自动丢弃最旧的"""
+        if self._history is None:
+            self._history = self._load_history()
+        return self._history
+    
+    def _load_history(self) -> deque:
+        """读取历史日志的最后 HISTORY_LIMIT 行；旧版本存放在 config.json 中的历史记录迁移到日志"""
+        history = deque(maxlen=HISTORY_LIMIT)
+        try:
+            tail = deque(maxlen=HISTORY_LIMIT)
+            lines = 0
+            with open(self.history_file, 'rb') as f:
+                for lines, line in enumerate(f, 1):
+                    tail.append(line)
+            self._history_lines = lines
+        except FileNotFoundError:
+            legacy = self._cfg.get('history')
+            if legacy:
+                history.extend(legacy[:HISTORY_LIMIT])
+                self._compact_history(history)
+                self._remove('history')
+            return history
+        except OSError:
+            return history
+        
+        for line in reversed(tail):
+            try:
+                history.append(orjson.loads(line) if orjson else json.loads(line))
+            except ValueError:
+                continue  # 跳过写入中断残留的半行
+        return history
+    
+    def _compact_history(self, history: deque):
+        """把历史日志重写为当前保留的记录 (旧的在前)"""
+        try:
+            _atomic_write(self.history_file, b''.join(_dumps_line(item) for item in reversed(history)))
+            self._history_lines = len(history)
+        except (IOError, TypeError, ValueError) as e:
+            print(f"保存历史记录失败: {e}")
+    
+    def get_history(self) -> Tuple[dict, ...]:
+        """获取历史记录 (只读快照，新的在前；修改请用 add_to_history / clear_history)"""
+        return tuple(self._history_deque())
     
     def add_to_history(self, item: dict):
-        """添加到历史记录"""
-        history = self.get_history()
-        history.insert(0, item)
-        # 只保留最近50条
-        history = history[:50]
-        self.set('history', history)
+        """添加到历史记录 (只保留最近50条；日志只追加一行，积累过多时压缩)"""
+        history = self._history_deque()
+        history.appendleft(item)
+        if self._history_lines >= HISTORY_COMPACT_LINES:
+            self._compact_history(history)
+            return
+        try:
+            with open(self.history_file, 'ab') as f:
+                f.write(_dumps_line(item))
+            self._history_lines += 1
+        except (IOError, TypeError, ValueError) as e:
+            print(f"保存历史记录失败: {e}")
     
     def get_gpt_model(self) -> str:
         """获取GPT模型设置"""
@@ -113,5 +365,7 @@ class Config:
     
     def clear_history(self):
         """清空历史记录"""
-        self.set('history', [])
+        history = self._history_deque()
+        history.clear()
+        self._compact_history(history)
 
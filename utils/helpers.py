@@ -3,6 +3,45 @@
 """
 import re
 import os
+import time
+import functools
+from typing import Iterable, Iterator, Optional, Tuple
+
+
+# BV号 / AV号 合并为一个模式，一次扫描即可得到结果
+_BILI_RE = re.compile(r'(?:(?P<bv>BV[a-zA-Z0-9]{10})|av(?P<av>\d+))', re.IGNORECASE)
+# 文件名中的非法字符 -> '_' (str.translate 逐字符查表，比正则替换快得多)
+_ILLEGAL_TRANSLATE = str.maketrans({c: '_' for c in '<>:"/\\|?*'})
+
+
+def _match_video_id(m: re.Match) -> str:
+    """由正则匹配结果得到视频ID，前缀统一为 'BV' / 'av' (BV号正文区分大小写，保持原样)"""
+    bv = m.group('bv')
+    return 'BV' + bv[2:] if bv else f"av{m.group('av')}"
+
+
+@functools.lru_cache(maxsize=256)
+def parse_bilibili_url(url: str) -> Optional[Tuple[str, str]]:
+    """
+    解析Bilibili链接 / BV号 / AV号 (结果按输入缓存，预览、校验、缓存键等处共用)
+    
+    支持的链接格式:
+    https://www.bilibili.com/video/BV1xx411c7XW
+    https://b23.tv/BV1xx411c7XW
+    BV1xx411c7XW
+    av170001
+    
+    返回: (视频ID, 规范化的视频页链接)，无法识别时返回 None
+    """
+    if not url:
+        return None
+    
+    m = _BILI_RE.search(url)
+    if not m:
+        return None
+    video_id = _match_video_id(m)
+    
+    return video_id, f"https://www.bilibili.com/video/{video_id}"
 
 
 def validate_bilibili_url(url: str) -> tuple[bool, str]:
@@ -16,61 +55,152 @@ def validate_bilibili_url(url: str) -> tuple[bool, str]:
     
     url = url.strip()
     
-    # 支持的链接格式:
-    # https://www.bilibili.com/video/BV1xx411c7XW
-    # https://b23.tv/BV1xx411c7XW
-    # BV1xx411c7XW
-    # av170001
+    # 快速路径：最常见的输入是裸 BV / AV 号，无需正则
+    rest = url[2:]
+    if len(url) == 12 and url[0] in 'Bb' and url[1] in 'Vv' and rest.isascii() and rest.isalnum():
+        return True, 'BV' + rest
+    if url[:2] in ('av', 'AV', 'Av', 'aV') and rest.isascii() and rest.isdigit():
+        return True, 'av' + rest
     
-    # BV号格式
-    bv_pattern = r'(BV[a-zA-Z0-9]{10})'
-    # AV号格式
-    av_pattern = r'av(\d+)'
+    parsed = parse_bilibili_url(url)
+    if parsed:
+        return True, parsed[0]
+    
+    return False, "无效的Bilibili链接格式，请输入完整链接或BV/AV号"
+
+
+def validate_bilibili_urls(urls: Iterable[str]) -> Iterator[Tuple[int, bool, str]]:
+    """
+    批量验证Bilibili链接：拼接后用一次正则扫描处理全部链接
     
-    bv_match = re.search(bv_pattern, url, re.IGNORECASE)
-    if bv_match:
-        return True, bv_match.group(1)
+    返回: 逐个产出 (序号, 是否有效, 错误信息或视频ID)，顺序与输入一致
+    """
+    stripped = [url.strip() if url else '' for url in urls]
+    joined = '\n'.join(stripped)
     
-    av_match = re.search(av_pattern, url, re.IGNORECASE)
-    if av_match:
-        return True, f"av{av_match.group(1)}"
+    # 每个链接在拼接串中的结束位置 (模式不含换行，匹配不会跨越两个链接)
+    ends = []
+    pos = 0
+    for url in stripped:
+        pos += len(url)
+        ends.append(pos)
+        pos += 1
     
-    return False, "无效的Bilibili链接格式，请输入完整链接或BV/AV号"
+    found = {}
+    idx = 0
+    for m in _BILI_RE.finditer(joined):
+        while m.start() > ends[idx]:
+            idx += 1
+        if idx not in found:
+            found[idx] = _match_video_id(m)
+    
+    for i, url in enumerate(stripped):
+        if not url:
+            yield i, False, "链接不能为空"
+        elif i in found:
+            yield i, True, found[i]
+        else:
+            yield i, False, "无效的Bilibili链接格式，请输入完整链接或BV/AV号"
+
+
+_SIZE_UNITS = ('B', 'KB', 'MB', 'GB', 'TB')
 
 
-def format_file_size(size_bytes: int) -> str:
-    """格式化文件大小"""
-    for unit in ['B', 'KB', 'MB', 'GB']:
-        if size_bytes < 1024:
-            return f"{size_bytes:.1f} {unit}"
-        size_bytes /= 1024
-    return f"{size_bytes:.1f} TB"
+# 以下两个格式化函数在进度刷新时被频繁调用，内置函数与单位表通过默认参数绑定为局部变量
+def format_file_size(size_bytes: int, _units=_SIZE_UNITS, _int=int, _min=min) -> str:
+    """格式化文件大小 (由二进制位数直接算出单位，无需逐级相除)"""
+    if size_bytes < 1024:
+        return f"{size_bytes:.1f} B"
+    idx = _min((_int(size_bytes).bit_length() - 1) // 10, len(_units) - 1)
+    return f"{size_bytes / (1 << (idx * 10)):.1f} {_units[idx]}"
 
 
-def format_duration(seconds: float) -> str:
+def format_duration(seconds: float, _int=int, _divmod=divmod) -> str:
     """格式化时长"""
-    hours = int(seconds // 3600)
-    minutes = int((seconds % 3600) // 60)
-    secs = int(seconds % 60)
-    
-    if hours > 0:
-        return f"{hours:02d}:{minutes:02d}:{secs:02d}"
-    return f"{minutes:02d}:{secs:02d}"
+    minutes, secs = _divmod(_int(seconds), 60)
+    hours, minutes = _divmod(minutes, 60)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}" if hours else f"{minutes:02d}:{secs:02d}"
 
 
 def ensure_dir(path: str) -> str:
-    """确保目录存在"""
-    if not os.path.exists(path):
-        os.makedirs(path)
+    """确保目录存在 (运行期间被删除的目录会重新创建)"""
+    os.makedirs(path, exist_ok=True)
     return path
 
 
-def safe_filename(name: str, max_length: int = 50) -> str:
-    """生成安全的文件名"""
+def safe_filename(name: str, max_length: int = 50, max_bytes: int = 200) -> str:
+    """
+    生成安全的文件名
+    
+    除字符数外还按 UTF-8 字节数截断：中文标题每字 3 字节，
+    文件系统对单个文件名的限制按字节计算 (如 ext4 为 255 字节)
+    """
     # 移除非法字符
-    illegal_chars = r'[<>:"/\\|?*]'
-    safe_name = re.sub(illegal_chars, '_', name)
+    safe_name = name.translate(_ILLEGAL_TRANSLATE)
     # 限制长度
     if len(safe_name) > max_length:
         safe_name = safe_name[:max_length]
+    # 限制字节数 (截断处落在多字节字符中间时丢弃残缺的部分)
+    encoded = safe_name.encode('utf-8')
+    if len(encoded) > max_bytes:
+        safe_name = encoded[:max_bytes].decode('utf-8', errors='ignore')
     return safe_name.strip()
+
+
+def output_name_candidates(directory: str, stem: str, ext: str = '.md') -> Iterator[str]:
+    """输出文件的候选路径：先用标题本身，已存在时依次改用带时间戳、再带序号的文件名"""
+    yield os.path.join(directory, f"{stem}{ext}")
+    timestamp = time.strftime("%Y%m%d_%H%M")
+    yield os.path.join(directory, f"{stem}_{timestamp}{ext}")
+    for n in range(2, 1000):
+        yield os.path.join(directory, f"{stem}_{timestamp}_{n}{ext}")
+
+
+def create_temp_file(directory: str, suffix: str = '.tmp') -> Tuple[int, str]:
+    """
+    在目录中独占创建一个新的临时文件，返回 (文件描述符, 路径)
+    
+    与 tempfile.mkstemp 不同，权限按 umask 取默认值 (而非 0600)，发布后的输出文件保持普通权限
+    """
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0)
+    while True:
+        path = os.path.join(directory, f".bili_{os.urandom(6).hex()}{suffix}")
+        try:
+            return os.open(path, flags, 0o666), path
+        except FileExistsError:
+            continue
+
+
+def publish_new_file(tmp_path: str, candidates: Iterable[str]) -> str:
+    """
+    把已写好的临时文件发布为第一个尚不存在的候选路径，绝不覆盖已有文件
+    
+    优先硬链接 (目标已存在时原子地失败，且不会留下空占位文件)；
+    文件系统不支持硬链接时以 'x' 模式独占占位后再替换，替换失败时删除占位。
+    成功后删除临时文件，返回最终路径；候选路径全部已存在时抛出 FileExistsError
+    """
+    for path in candidates:
+        try:
+            os.link(tmp_path, path)
+        except FileExistsError:
+            continue
+        except OSError:
+            try:
+                open(path, 'x').close()
+            except FileExistsError:
+                continue
+            try:
+                os.replace(tmp_path, path)
+            except BaseException:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                raise
+            return path
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        return path
+    raise FileExistsError(f"没有可用的输出文件名: {tmp_path}")
@@ -0,0 +1,29 @@
+"""
+HTTP 会话模块
+进程内共享一个 requests.Session：连接池复用 TCP/TLS 连接，
+界面预览、处理线程等多次请求 B 站接口时不再重复握手
+"""
+from typing import Any
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36"
+
+# 默认超时 (连接, 读取)，单位秒
+DEFAULT_TIMEOUT = (3, 5)
+
+# requests.Session 的连接池是线程安全的；预览线程与处理线程可同时使用
+SESSION = requests.Session()
+SESSION.headers.update({
+    "User-Agent": USER_AGENT,
+    "Referer": "https://www.bilibili.com",
+})
+SESSION.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=8))
+
+
+def get(url: str, **kwargs: Any) -> requests.Response:
+    """使用共享会话发起 GET 请求，未指定时使用默认超时"""
+    kwargs.setdefault('timeout', DEFAULT_TIMEOUT)
+    return SESSION.get(url, **kwargs)